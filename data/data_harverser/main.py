@@ -5,11 +5,16 @@ import argparse
 from sources.downloader import downloader
 from sources.scrawler import scrawler
 from sources.sound2spec import sound2spec
+from sources.dedup import dedup, dedup_report
+from sources.pipeline import harvest
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--scrawl', help='Run in youtube scrawling', required=False)
 parser.add_argument('--download', help='Run youtube download', required=False)
 parser.add_argument('--sound2spec', help='Convert sound to spectrogram ', required=False)
+parser.add_argument('--dedup', help='Remove near-duplicate clips already downloaded for a class', required=False)
+parser.add_argument('--dedup-report', action='store_true', help='Report duplicates removed per class')
+parser.add_argument('--pipeline', help='Run scraping, download and spectrogram conversion as one streaming pipeline', required=False)
 parser.add_argument('--config', help='Config file path.', required=True)
 
 args = parser.parse_args()
@@ -41,6 +46,12 @@ def main():
         scrawler(config, args.scrawl)
     elif args.sound2spec:
         sound2spec(config, args.sound2spec)
+    elif args.pipeline:
+        harvest(config, args.pipeline)
+    elif args.dedup:
+        dedup(config, args.dedup)
+    elif args.dedup_report:
+        dedup_report(config)
     else:
         print("Please specify a mode to run.")
 
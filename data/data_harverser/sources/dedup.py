@@ -0,0 +1,217 @@
+#!/usr/bin python3
+
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+import librosa
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# fingerprint: Haitsma-Kalker bits over N_MELS mel bands and N_SEGMENTS time slices -> 256 bits
+N_MELS = 33
+N_SEGMENTS = 9
+FINGERPRINT_BITS = (N_SEGMENTS - 1) * (N_MELS - 1)
+# stored with the index, fingerprints of another version are not comparable
+FINGERPRINT_VERSION = 2
+
+def fingerprint(wav_path: str, sample_rate: int) -> int:
+    """
+    Compact perceptual hash of a clip: bit (n, m) is the sign of how the energy difference between
+    mel bands m and m+1 changes from time slice n to n+1. Only changes over time count, so the overall
+    spectral tilt shared by noise-like sounds (rain, wind, ambience) does not make distinct clips match,
+    while gain changes and re-encoding of the same clip flip only a few bits.
+    """
+    waveform, sr = librosa.load(wav_path, sr=sample_rate)
+    S = librosa.feature.melspectrogram(y=waveform, sr=sr, n_fft=2048, hop_length=1024, n_mels=N_MELS)
+    segments = np.array_split(S, N_SEGMENTS, axis=1)
+    energy = np.log(np.stack([segment.mean(axis=1) for segment in segments]) + 1e-10)
+    bits = np.diff(np.diff(energy, axis=1), axis=0) > 0
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class FingerprintIndex:
+    """
+    Per-class fingerprint index persisted as JSON next to the clips.
+    Fingerprints are split into bands for lookup: two fingerprints within max_distance bits
+    share at least one identical band (pigeonhole), so band buckets find every match above
+    the similarity threshold and only candidates are compared bit by bit.
+    """
+    def __init__(self, path: str, similarity: float, save_every: int = 50, save_interval: float = 10.0) -> None:
+        self.path = path
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.unsaved = 0
+        self.last_save = time.monotonic()
+        self.max_distance = int((1.0 - similarity) * FINGERPRINT_BITS)
+        n_bands = 1
+        while n_bands <= self.max_distance and n_bands < FINGERPRINT_BITS:
+            n_bands *= 2
+        self.n_bands = n_bands
+        self.band_bits = FINGERPRINT_BITS // n_bands
+        self.fingerprints = {}
+        self.buckets = {}
+        self.kept = 0
+        self.dropped = 0
+        # the harvest pipeline checks clips from several download threads
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            self.kept = saved.get("kept", 0)
+            self.dropped = saved.get("dropped", 0)
+            if saved.get("version", 1) == FINGERPRINT_VERSION:
+                for name, value in saved.get("fingerprints", {}).items():
+                    self._insert(name, int(value, 16))
+            else:
+                logger.warning(f"{path} holds fingerprints of another version, run --dedup to index the clips again")
+
+    def _bands(self, fp: int) -> list:
+        mask = (1 << self.band_bits) - 1
+        return [(i, (fp >> (i * self.band_bits)) & mask) for i in range(self.n_bands)]
+
+    def _insert(self, name: str, fp: int) -> None:
+        self.fingerprints[name] = fp
+        for band in self._bands(fp):
+            self.buckets.setdefault(band, []).append(name)
+
+    def match(self, fp: int, exclude=None):
+        """
+        Return (name, similarity) of the closest indexed clip within the threshold, or None.
+        """
+        best = None
+        seen = set()
+        for band in self._bands(fp):
+            for name in self.buckets.get(band, []):
+                if name in seen or name == exclude:
+                    continue
+                seen.add(name)
+                distance = hamming(fp, self.fingerprints[name])
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (name, distance)
+        if best is None:
+            return None
+        return best[0], 1.0 - best[1] / FINGERPRINT_BITS
+
+    def is_duplicate(self, name: str, fp: int) -> bool:
+        """
+        True if fp duplicates another indexed clip (counted as dropped). The clip's own entry,
+        left by an earlier run of a retried video, does not count.
+        """
+        with self.lock:
+            found = self.match(fp, exclude=name)
+            if found is None:
+                return False
+            self.dropped += 1
+            logger.info(f"Duplicate clip {name} ~ {found[0]} (similarity {found[1]:.2f})")
+            return True
+
+    def add(self, name: str, fp: int) -> None:
+        with self.lock:
+            if name in self.fingerprints:
+                return
+            self._insert(name, fp)
+            self.kept += 1
+
+    def check_and_add(self, name: str, fp: int) -> bool:
+        """
+        True if fp duplicates an indexed clip, otherwise index it and return False.
+        """
+        if self.is_duplicate(name, fp):
+            return True
+        self.add(name, fp)
+        return False
+
+    def touch(self) -> None:
+        """
+        Record a change, saving after save_every changes or save_interval seconds.
+        Callers save() once more when they are done.
+        """
+        with self.lock:
+            self.unsaved += 1
+            due = self.unsaved >= self.save_every or time.monotonic() - self.last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def save(self) -> None:
+        # snapshot under the shared lock, serialize and write outside it so lookups do not wait on the disk
+        with self.lock:
+            fingerprints = dict(self.fingerprints)
+            kept, dropped = self.kept, self.dropped
+            self.unsaved = 0
+            self.last_save = time.monotonic()
+        data = {
+            "version": FINGERPRINT_VERSION,
+            "kept": kept,
+            "dropped": dropped,
+            "fingerprints": {name: format(fp, 'x') for name, fp in fingerprints.items()},
+        }
+        with self.save_lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+
+def load_index(config: dict, class_name: str) -> FingerprintIndex:
+    folder = Path(config["SOUND_FOLDER"]) / class_name
+    folder.mkdir(parents=True, exist_ok=True)
+    return FingerprintIndex(str(folder / config["DEDUP_INDEX_FILE"]), config["DEDUP_SIMILARITY"])
+
+def is_duplicate_clip(index: FingerprintIndex, clip_path: str, config: dict) -> bool:
+    fp = fingerprint(clip_path, config["DEFAULT_SAMPLE_RATE"])
+    duplicate = index.check_and_add(Path(clip_path).name, fp)
+    index.touch()
+    return duplicate
+
+def check_clip(index: FingerprintIndex, clip_path: str, config: dict) -> tuple:
+    """
+    (duplicate, fingerprint) of a freshly extracted clip. The fingerprint is only indexed
+    with keep_clip once the clip passed the remaining checks.
+    """
+    fp = fingerprint(clip_path, config["DEFAULT_SAMPLE_RATE"])
+    duplicate = index.is_duplicate(Path(clip_path).name, fp)
+    if duplicate:
+        index.touch()
+    return duplicate, fp
+
+def keep_clip(index: FingerprintIndex, clip_path: str, fp: int) -> None:
+    index.add(Path(clip_path).name, fp)
+    index.touch()
+
+def dedup(config: dict, class_name: str) -> None:
+    """
+    Backfill: fingerprint clips already on disk for a class and delete the near duplicates.
+    """
+    index = load_index(config, class_name)
+    folder = Path(config["SOUND_FOLDER"]) / class_name
+    for clip in sorted(folder.glob(f"*{config['EXT']}")):
+        if clip.name in index.fingerprints:
+            continue
+        if is_duplicate_clip(index, str(clip), config):
+            os.remove(clip)
+    index.save()
+    logger.info(f"{class_name}: kept {index.kept}, removed {index.dropped} near-duplicate clips")
+
+def dedup_report(config: dict) -> dict:
+    """
+    Log and return, for every class, how much of the harvested dataset was dropped as duplicate.
+    """
+    report = {}
+    root = Path(config["SOUND_FOLDER"])
+    if not root.exists():
+        return report
+    for class_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        if not (class_dir / config["DEDUP_INDEX_FILE"]).exists():
+            continue
+        index = load_index(config, class_dir.name)
+        total = index.kept + index.dropped
+        removed = index.dropped / total if total else 0.0
+        report[class_dir.name] = {"kept": index.kept, "dropped": index.dropped, "removed_ratio": removed}
+        logger.info(f"{class_dir.name}: {index.dropped}/{total} clips removed as duplicates ({removed:.1%})")
+    return report
@@ -4,13 +4,15 @@ from __future__ import unicode_literals
 import logging
 import os
 import sys
+import subprocess
 import yt_dlp as youtube_dl
 import pandas as pd
 from pathlib import Path
-from pydub import AudioSegment
 import openai
 import re
 
+from sources.dedup import load_index, check_clip, keep_clip
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -27,64 +29,74 @@ def safe_remove(path: str) -> None:
     if os.path.exists(path):
         os.remove(path)
 
-def get_yt_options(full_path: str) -> dict:
+# audio-only streams first, the smallest muxed stream only when a video has none
+AUDIO_FORMAT = 'bestaudio[vcodec=none]/bestaudio/worst'
+
+def get_yt_options() -> dict:
     return {
-        'quiet': False,
-        'format': 'worst',
-        'outtmpl': full_path,
+        'quiet': True,
+        'format': AUDIO_FORMAT,
         'noplaylist': True,
-        'continue_dl': True,
-        'keepvideo': False,
-        'verbose': True,
         'extractor_args': {'youtube': {'nocheckcertificate': True}},
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-        }],
-        #'postprocessor_args': ['-t', duration_stamp]
     }
 
-def download_clip_yt(ydl, url: str, info_dict: dict, full_path_wav: str) -> None:
-    try:
-        ydl.prepare_filename(info_dict)
-        ydl.download([url])
-    except Exception as e:
-        safe_remove(full_path_wav)
-        raise e
-    
-def download_clip(url: str, name: str, path_folder: str, config: dict) -> bool:
-    full_path = f'{path_folder}/{name}' 
-    full_path_wav = f'{path_folder}/{name}.wav' 
-    ydl_opts = get_yt_options(full_path)
+def probe_duration(media_url: str, headers: dict) -> float:
+    # direct media links (e.g. a local HTTP server) come without a duration in the info dict
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0']
+    if headers:
+        command += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    output = subprocess.run(command + [media_url], capture_output=True, text=True, check=True).stdout
+    return float(output.strip())
+
+def get_audio_source(url: str, name: str, config: dict):
+    """
+    Resolve the stream to read windows from without downloading anything.
+    Returns {"url", "headers", "duration"} or None when the video is unusable.
+    """
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        with youtube_dl.YoutubeDL(get_yt_options()) as ydl:
             ydl.cache.remove()
             info_dict = ydl.extract_info(url, download=False)
-
-            if info_dict == None:
-                logger.warning(f"Empty info dict for {name}")
-                return False
-            
-            if 'duration' in info_dict:
-                duration = info_dict['duration']
-            else:
-                return False
-
-            if duration > config["MAX_VIDEO_DURATION"]:
-                logger.warning(f"Video too long for {name}")
-                return False
-            if duration > config["SAMPLE_AUDIO_DURATION"]:
-                download_clip_yt(ydl, url, info_dict, full_path_wav)
-            else:
-                logger.warning(f"Video too short for {name}")
-                return False
     except Exception as e:
-        logger.error(f"Fatal error on download of {name} : {e}")
+        logger.error(f"Fatal error on extraction of {name} : {e}")
+        return None
+    if info_dict == None or 'url' not in info_dict:
+        logger.warning(f"Empty info dict for {name}")
+        return None
+    headers = info_dict.get('http_headers', {})
+    duration = info_dict.get('duration')
+    if duration is None:
+        try:
+            duration = probe_duration(info_dict['url'], headers)
+        except Exception as e:
+            logger.warning(f"Unknown duration for {name} : {e}")
+            return None
+    if duration > config["MAX_VIDEO_DURATION"]:
+        logger.warning(f"Video too long for {name}")
+        return None
+    if duration <= config["SAMPLE_AUDIO_DURATION"]:
+        logger.warning(f"Video too short for {name}")
+        return None
+    return {"url": info_dict['url'], "headers": headers, "duration": duration}
+
+def extract_range(source: dict, start: float, length: float, output_path: str, sample_rate: int) -> bool:
+    """
+    Fetch only [start, start + length) of the stream (ffmpeg seeks with HTTP range requests)
+    and write it as a WAV resampled to sample_rate.
+    """
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y']
+    if source["headers"]:
+        command += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in source["headers"].items())]
+    command += ['-ss', str(start), '-t', str(length), '-i', source["url"],
+                '-vn', '-acodec', 'pcm_s16le', '-ar', str(sample_rate), output_path]
+    try:
+        subprocess.run(command, capture_output=True, check=True, timeout=max(60, length * 6))
+    except Exception as e:
+        logger.warning(f"Range {start}s-{start + length}s not extracted : {e}")
+        safe_remove(output_path)
         return False
-
-    if confirm_download(full_path_wav, 20000) == False:
-        logger.warning(f"Download not confirmed {url}")
-        safe_remove(full_path_wav)
+    if confirm_download(output_path, 20000) == False:
+        safe_remove(output_path)
         return False
     return True
 
@@ -120,35 +132,53 @@ def whisper_check_voices(wav_path: str, max_char: int) -> bool:
         return True
     return False
 
-def download_clip_samples(url: str, name: str, path_folder: str, save_file: str, config: dict) -> bool:
-    wav_path = f'{path_folder}/{name}.wav' 
-    if download_clip(url, name, path_folder, config) == False:
-        safe_remove(wav_path)
+def download_clip_samples(url: str, name: str, path_folder: str, save_file: str, config: dict, index=None,
+                          on_clip=None, stop=None) -> bool:
+    """
+    Extract the kept windows of one video. on_clip is called with the path of every kept clip;
+    when stop is set the video is left unrecorded so a later run retries it.
+    """
+    source = get_audio_source(url, name, config)
+    if source is None:
         return False
-    save_download(save_file, url)
-    logger.info(f"Downloaded {name}")
-    audio = AudioSegment.from_file(wav_path, format="wav")
-    duration = len(audio)
+    # windows are planned from the reported duration, only the ones we keep are fetched
+    duration = source["duration"]
     split_duration = config["SAMPLE_AUDIO_DURATION"]
     i = config["START_SAMPLE_IDX"]
     man_voice_count = 0
     spacing = 2
-    while i * split_duration <= (duration/1000) - split_duration:
-        start_time = (i-1)*split_duration*1000
-        end_time = i*split_duration*1000 
-        part = audio[start_time:end_time]
+    fetched = 0
+    while i * split_duration <= duration - split_duration:
+        if stop is not None and stop.is_set():
+            return False
+        start_time = (i-1)*split_duration
         part_path = f"{path_folder}/{name}_{i}.wav"
-        part.export(part_path, format="wav")
-        if whisper_check_voices(part_path, 25) == True:
+        if extract_range(source, start_time, split_duration, part_path, config["DEFAULT_SAMPLE_RATE"]) == False:
+            i += spacing
+            continue
+        fetched += 1
+        # local fingerprint lookup first, it is much cheaper than the whisper call
+        duplicate, fp = check_clip(index, part_path, config) if index is not None else (False, None)
+        if duplicate:
+            safe_remove(part_path)
+        elif whisper_check_voices(part_path, 25) == True:
             man_voice_count += 1
             safe_remove(part_path)
         else:
             logger.info(f"extracted {i-config['START_SAMPLE_IDX']}th sample...")
             man_voice_count = 0
+            if index is not None:
+                keep_clip(index, part_path, fp)
+            if on_clip is not None:
+                on_clip(part_path)
         if man_voice_count >= 3:
             spacing *= 3
         i += spacing
-    safe_remove(wav_path)
+    if fetched == 0:
+        logger.warning(f"Download not confirmed {url}")
+        return False
+    save_download(save_file, url)
+    logger.info(f"Downloaded {fetched} windows of {name}")
     return True
     
 def check_donwloaded(url: str, downloaded: list) -> bool:
@@ -167,16 +197,22 @@ def downloader(config: dict, class_name: str) -> None:
     except FileNotFoundError as e:
         raise FileNotFoundError(f"File {path_csv} not found")
     downloaded = load_checkpoint_file(config["SAVE_DOWNLOADED_FILE"])
+    fingerprints = load_index(config, class_name)
     count = 0
-    for index, row in dat.iterrows():
-        t = re.sub(r'[^a-zA-Z]', '', row["title"])
-        u = row["url"]
-        if check_donwloaded(u, downloaded) == True:
-            logger.info(f"Already downloaded : {t}")
-            continue
-        logger.info(f"Downloading : {t} ({u})")
-        if download_clip_samples(u, t, output_folder, save_file, config) == True:
-            count += 1
-        else:
-            logger.error(f"Failed download : {t}")
-    logger.info(f"downloaded {count} sound from youtube")
\ No newline at end of file
+    try:
+        for index, row in dat.iterrows():
+            t = re.sub(r'[^a-zA-Z]', '', row["title"])
+            u = row["url"]
+            if check_donwloaded(u, downloaded) == True:
+                logger.info(f"Already downloaded : {t}")
+                continue
+            logger.info(f"Downloading : {t} ({u})")
+            if download_clip_samples(u, t, output_folder, save_file, config, fingerprints) == True:
+                count += 1
+            else:
+                logger.error(f"Failed download : {t}")
+    finally:
+        # the index only saves every few clips while downloading
+        fingerprints.save()
+    logger.info(f"downloaded {count} sound from youtube")
+    logger.info(f"{class_name}: dropped {fingerprints.dropped} near-duplicate clips, kept {fingerprints.kept}")
\ No newline at end of file
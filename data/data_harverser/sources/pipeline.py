@@ -0,0 +1,240 @@
+#!/usr/bin python3
+
+import os
+import re
+import wave
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+import pandas as pd
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from sources.scrawler import youtube_search, create_file_if_not_exists
+from sources.downloader import download_clip_samples, load_checkpoint_file
+from sources.sound2spec import sound_file_to_spectrogram
+from sources.dedup import load_index
+
+logger = logging.getLogger(__name__)
+
+# clips written by download_clip_samples: <letters-only title>_<window index>.wav
+CLIP_PATTERN = re.compile(r'^[a-zA-Z]*_\d+\.wav$')
+
+class PipelineStopped(Exception):
+    pass
+
+class CheckpointFile:
+    """
+    dl_checkpoint shared by the download workers, one flushed line per finished video.
+    """
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def write(self, line: str) -> None:
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+class Progress:
+    def __init__(self) -> None:
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counts[key] += n
+
+    def log(self, videos: queue.Queue, clips: queue.Queue) -> None:
+        with self.lock:
+            c = dict(self.counts)
+        logger.info(f"scrape: {c.get('videos_found', 0)} videos | "
+                    f"download: {c.get('videos_done', 0)} done, {c.get('videos_failed', 0)} failed, "
+                    f"{videos.qsize()} queued, {c.get('clips', 0)} clips | "
+                    f"spectrogram: {c.get('images', 0)} done, {c.get('images_skipped', 0)} skipped, "
+                    f"{clips.qsize()} queued")
+
+def _ignore_sigint() -> None:
+    # Ctrl-C is handled by the parent, which lets in-flight spectrograms finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def clip_duration(path: str) -> float:
+    with wave.open(path, 'rb') as audio_file:
+        return audio_file.getnframes() / audio_file.getframerate()
+
+class HarvestPipeline:
+    """
+    Scrape -> download/split -> spectrogram for one class, as concurrent stages joined by bounded queues.
+    A full queue blocks the stage feeding it, so a slow stage throttles the ones before it.
+    Everything is resumable: videos in the class csv but not in dl_checkpoint are downloaded again,
+    clips on disk without a spectrogram are converted again.
+    """
+    def __init__(self, config: dict, class_name: str) -> None:
+        self.config = config
+        self.class_name = class_name
+        self.csv_file = f"{config['CSV_FOLDER_PATH']}/{class_name}.csv"
+        self.sound_folder = Path(config["SOUND_FOLDER"]) / class_name
+        self.image_folder = Path(config["IMAGE_FOLDER"]) / class_name
+        self.videos = queue.Queue(maxsize=config["PIPELINE_QUEUE_SIZE"])
+        self.clips = queue.Queue(maxsize=config["PIPELINE_QUEUE_SIZE"])
+        self.stop = threading.Event()
+        self.progress = Progress()
+        self.enqueued = set()
+
+    def put(self, q: queue.Queue, item) -> bool:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q: queue.Queue):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def enqueue_video(self, title: str, url: str) -> None:
+        if url in self.downloaded or url in self.enqueued:
+            return
+        self.enqueued.add(url)
+        self.progress.add("videos_found")
+        if not self.put(self.videos, (re.sub(r'[^a-zA-Z]', '', title), url)):
+            raise PipelineStopped()
+
+    def on_new_videos(self, videos: list) -> None:
+        for video in videos:
+            self.enqueue_video(video['snippet']['title'], f"https://www.youtube.com/watch?v={video['id']['videoId']}")
+
+    def scrape(self) -> None:
+        try:
+            # resume: videos found by an earlier crawl that were never downloaded
+            if os.path.exists(self.csv_file):
+                for _, row in pd.read_csv(self.csv_file).iterrows():
+                    self.enqueue_video(row["title"], row["url"])
+            key = os.getenv("YOUTUBE_API_KEY")
+            if key:
+                youtube_search(self.class_name, self.csv_file, self.config, dev_key=key,
+                               on_new=self.on_new_videos, stop=self.stop)
+            else:
+                logger.warning("YOUTUBE_API_KEY is not set, only videos already in the csv are processed.")
+        except PipelineStopped:
+            pass
+        except Exception as e:
+            logger.error(f"Scraping {self.class_name} failed: {e}")
+
+    def on_clip(self, path: str) -> None:
+        self.progress.add("clips")
+        # when stopping the clip stays on disk and is converted on resume
+        self.put(self.clips, path)
+
+    def download_worker(self) -> None:
+        while True:
+            item = self.get(self.videos)
+            if item is None:
+                return
+            title, url = item
+            try:
+                done = download_clip_samples(url, title, str(self.sound_folder), self.checkpoint, self.config,
+                                             self.fingerprints, on_clip=self.on_clip, stop=self.stop)
+            except Exception as e:
+                logger.error(f"Failed download : {title} : {e}")
+                done = False
+            if self.stop.is_set():
+                return
+            self.progress.add("videos_done" if done else "videos_failed")
+
+    def image_path(self, clip_path: str) -> str:
+        return str(self.image_folder / f"sound_{Path(clip_path).stem}.png")
+
+    def leftover_clips(self) -> None:
+        # resume: clips of an earlier run that never got their spectrogram
+        for clip in sorted(self.sound_folder.glob("*.wav")):
+            if CLIP_PATTERN.match(clip.name) and not os.path.exists(self.image_path(str(clip))):
+                if not self.put(self.clips, str(clip)):
+                    return
+
+    def spectrogram_worker(self, pool: ProcessPoolExecutor) -> None:
+        while True:
+            path = self.get(self.clips)
+            if path is None:
+                return
+            try:
+                if not os.path.exists(path) or os.path.exists(self.image_path(path)) \
+                   or clip_duration(path) != self.config["SAMPLE_AUDIO_DURATION"]:
+                    self.progress.add("images_skipped")
+                    continue
+                stem = Path(path).stem
+                pool.submit(sound_file_to_spectrogram, path, str(self.image_folder), stem, stem).result()
+                self.progress.add("images")
+            except Exception as e:
+                logger.error(f"Spectrogram of {path} failed: {e}")
+                self.progress.add("images_skipped")
+
+    def wait(self, threads: list) -> None:
+        interval = self.config["PROGRESS_INTERVAL_S"]
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(interval)
+                self.progress.log(self.videos, self.clips)
+
+    def run(self) -> None:
+        create_file_if_not_exists(self.csv_file)
+        self.sound_folder.mkdir(parents=True, exist_ok=True)
+        self.image_folder.mkdir(parents=True, exist_ok=True)
+        try:
+            self.downloaded = set(load_checkpoint_file(self.config["SAVE_DOWNLOADED_FILE"]))
+        except FileNotFoundError:
+            self.downloaded = set()
+        self.checkpoint = CheckpointFile(self.config["SAVE_DOWNLOADED_FILE"])
+        self.fingerprints = load_index(self.config, self.class_name)
+        n_download = self.config["DOWNLOAD_WORKERS"]
+        n_spectrogram = self.config["SPECTROGRAM_WORKERS"]
+        # matplotlib is not thread safe, spectrograms are drawn in worker processes
+        pool = ProcessPoolExecutor(max_workers=n_spectrogram, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_ignore_sigint)
+
+        producers = [threading.Thread(target=self.leftover_clips, name="leftovers")]
+        scraper = threading.Thread(target=self.scrape, name="scrape")
+        downloaders = [threading.Thread(target=self.download_worker, name=f"download_{i}") for i in range(n_download)]
+        converters = [threading.Thread(target=self.spectrogram_worker, args=(pool,), name=f"spectrogram_{i}")
+                      for i in range(n_spectrogram)]
+        for thread in producers + [scraper] + downloaders + converters:
+            thread.start()
+        logger.info(f"Harvesting {self.class_name}: {n_download} download workers, {n_spectrogram} spectrogram workers")
+        try:
+            # end of stream: each finished stage sends one None per worker of the next stage
+            self.wait([scraper])
+            for _ in downloaders:
+                self.put(self.videos, None)
+            self.wait(producers + downloaders)
+            for _ in converters:
+                self.put(self.clips, None)
+            self.wait(converters)
+        except KeyboardInterrupt:
+            logger.warning("Stopping: finishing in-flight items, the rest is picked up on the next run.")
+            self.stop.set()
+            for thread in producers + [scraper] + downloaders + converters:
+                thread.join()
+            # the finally block still saves and closes everything, callers see the run did not complete
+            raise
+        finally:
+            self.stop.set()
+            self.fingerprints.save()
+            self.checkpoint.close()
+            # converters wait on each job, nothing is left queued in the pool once they returned
+            pool.shutdown(wait=True)
+            self.progress.log(self.videos, self.clips)
+
+def harvest(config: dict, class_name: str) -> None:
+    HarvestPipeline(config, class_name).run()
@@ -1,7 +1,11 @@
 import os
+import time
+import queue
 import logging
+import threading
 import pandas as pd
 import re
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from openai import OpenAI
@@ -14,6 +18,13 @@ logging.basicConfig(
 
 MIN_DURATION = 60
 MAX_DURATION = 1800
+# YouTube Data API v3 quota cost of each call
+SEARCH_COST = 100
+VIDEOS_COST = 1
+SEARCH_SUFFIXES = ["sound", "noise", "clip", "recording", "ambience"]
+# unclassified pages a query may have: its next search waits for the previous page's videos,
+# which may already reach MAX_VIDEO_COUNT
+PAGES_IN_FLIGHT = 1
 
 # Convert YouTube duration to seconds
 def convert_youtube_duration(duration):
@@ -56,63 +67,187 @@ def llm_check_title(title, query):
     result = "yes" in generated.lower()
     return result
 
-# Choose videos from search results
-def choose_video(youtube, result, count, total, class_name):
-    logging.info(f"Choosing videos for class: {class_name}")
-    chosen = []
+class QuotaExceeded(Exception):
+    pass
+
+class CrawlStopped(Exception):
+    pass
+
+# Token bucket shared by every thread of a crawl: `rate` calls per second on average, bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# API quota units a crawl may spend, checked before each call
+class QuotaBudget:
+    def __init__(self, units):
+        self.units = units
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def spend(self, cost):
+        with self.lock:
+            if self.spent + cost > self.units:
+                raise QuotaExceeded(f"Quota budget of {self.units} units exhausted ({self.spent} spent)")
+            self.spent += cost
+
+# Rate limited, quota accounted access to the search and videos endpoints.
+# googleapiclient services are not thread safe, each thread builds its own with `factory`.
+# No call is charged or made once the crawl stopped (search) or is full (videos).
+class YoutubeClient:
+    def __init__(self, factory, limiter, budget):
+        self.factory = factory
+        self.limiter = limiter
+        self.budget = budget
+        self.stop = threading.Event()
+        self.full = threading.Event()
+        self.local = threading.local()
+
+    def service(self):
+        if getattr(self.local, "service", None) is None:
+            self.local.service = self.factory()
+        return self.local.service
+
+    def search(self, query, page_token, per_page):
+        # the crawl may stop while waiting for a token
+        self.limiter.acquire()
+        if self.stop.is_set():
+            raise CrawlStopped()
+        self.budget.spend(SEARCH_COST)
+        return self.service().search().list(
+            q=query,
+            part='id,snippet',
+            maxResults=per_page,
+            pageToken=page_token
+        ).execute()
+
+    def durations(self, video_ids):
+        self.limiter.acquire()
+        if self.full.is_set():
+            raise CrawlStopped()
+        self.budget.spend(VIDEOS_COST)
+        video_details = self.service().videos().list(
+            part='contentDetails',
+            id=",".join(video_ids)
+        ).execute()
+        return {video['id']: convert_youtube_duration(video['contentDetails']['duration'])
+                for video in video_details['items']}
+
+# Choose videos from one page of search results
+def choose_video(client, result, class_name, title_check=llm_check_title):
+    candidates = []
     for item in result['items']:
-        count += 1
+        # each title check is an LLM call, do not keep classifying a crawl that is over
+        if client.full.is_set():
+            raise CrawlStopped()
         title = item['snippet']['title'].lower()
 
         if 'videoId' not in item['id'] or item['id']['kind'] != 'youtube#video':
             logging.debug(f"Skipping non video item or missing videoId: {item}")
             continue
 
-        if not llm_check_title(title, class_name):
+        if not title_check(title, class_name):
             logging.debug(f"Title rejected by LLM: {title}")
             continue
+        candidates.append(item)
 
-        video_id = item['id']['videoId']
-        video_details = youtube.videos().list(
-            part='contentDetails',
-            id=video_id
-        ).execute()
-
-        for video in video_details['items']:
-            duration_iso = video['contentDetails']['duration']
-            duration_s = convert_youtube_duration(duration_iso)
-
-            if MIN_DURATION <= duration_s <= MAX_DURATION:
-                logging.info(f"Saving video: {item['snippet']['title']}")
-                chosen.append(item)
-    return chosen, count
-
-# Get YouTube search results for a query
-def get_youtube_results(youtube, query, max_result, class_name, config):
+    if not candidates:
+        return []
+    # one videos.list call for the whole page (up to 50 ids) instead of one per video
+    durations = client.durations([item['id']['videoId'] for item in candidates])
+    chosen = []
+    for item in candidates:
+        if MIN_DURATION <= durations.get(item['id']['videoId'], 0) <= MAX_DURATION:
+            logging.info(f"Saving video: {item['snippet']['title']}")
+            chosen.append(item)
+    return chosen
+
+# State shared by the threads of one crawl
+class Crawl:
+    def __init__(self, client, class_name, config, title_check, queries):
+        self.client = client
+        self.class_name = class_name
+        self.config = config
+        self.title_check = title_check
+        self.stop = client.stop
+        # set once MAX_VIDEO_COUNT is reached, pages still queued are dropped (a quota stop still classifies them)
+        self.full = client.full
+        self.results = queue.Queue()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.per_query = {}
+        self.slots = {query: threading.BoundedSemaphore(PAGES_IN_FLIGHT) for query in queries}
+        self.futures = []
+
+    def submit(self, choosers, query, result):
+        with self.lock:
+            self.pending += 1
+        self.futures.append(choosers.submit(self.choose, query, result))
+
+    def choose(self, query, result):
+        try:
+            chosen = [] if self.full.is_set() else choose_video(self.client, result, self.class_name, self.title_check)
+        except Exception as e:
+            chosen = e
+        self.results.put((query, chosen))
+
+    def done(self, query):
+        with self.lock:
+            self.pending -= 1
+        self.slots[query].release()
+
+    def idle(self):
+        with self.lock:
+            return self.pending == 0
+
+# Walk the result pages of one query, handing each page to the chooser pool
+def get_youtube_results(crawl, query, choosers):
     logging.info(f"Fetching YouTube results for query: {query}")
     next_page_token = None
-    all_results = []
-    count = 0
 
-    while len(all_results) < config["RESULT_PER_QUERY"]:
-        search_exclusion = ""
-        result = youtube.search().list(
-            q=query + search_exclusion,
-            part='id,snippet',
-            maxResults=config["VIDEO_PER_PAGE"],
-            pageToken=next_page_token
-        ).execute()
+    slot = crawl.slots[query]
+
+    while True:
+        if not slot.acquire(timeout=0.5):
+            if crawl.stop.is_set():
+                break
+            continue
+        # counts are up to date now that the previous page was classified
+        if crawl.stop.is_set() or crawl.per_query.get(query, 0) >= crawl.config["RESULT_PER_QUERY"]:
+            slot.release()
+            break
+        try:
+            result = crawl.client.search(query, next_page_token, crawl.config["VIDEO_PER_PAGE"])
+        except (QuotaExceeded, CrawlStopped) as e:
+            slot.release()
+            if isinstance(e, QuotaExceeded):
+                logging.warning(f"{e}, stopping the crawl")
+                crawl.stop.set()
+            break
 
         logging.info(f"SEARCH: << {query} >> - got {len(result['items'])} results.")
-        choices, count = choose_video(youtube, result, count, max_result, class_name)
-        all_results.extend(choices)
+        crawl.submit(choosers, query, result)
         next_page_token = result.get('nextPageToken')
 
         if not next_page_token:
             break
 
-    return all_results
-
 # Create folder if it does not exist
 def create_folder_if_not_exists(folder_path):
     if not os.path.exists(folder_path):
@@ -148,41 +283,95 @@ def save_choices(choices, path):
     }
     save_to_csv(data, path)
 
-# Check if a video is already saved
-def already_saved(video, choices):
-    result = any(c['etag'] == video['etag'] for c in choices)
-    return result
-
-# Perform iterative YouTube search
-def youtube_search(query, csv_file, config, dev_key):
+# Video ids already in the class csv, so a new crawl only appends new videos
+def load_saved_ids(csv_path):
+    try:
+        return set(pd.read_csv(csv_path)['id'].astype(str))
+    except (FileNotFoundError, KeyError, pd.errors.EmptyDataError):
+        return set()
+
+# Concurrent YouTube search over the query expansions.
+# Pages are fetched and classified in parallel, results are deduplicated and saved as they arrive.
+# on_new is called with every batch of newly saved videos, setting stop ends the crawl early.
+def youtube_search(query, csv_file, config, dev_key=None, service_factory=None, title_check=llm_check_title, on_new=None,
+                   stop=None):
     logging.info(f"Starting YouTube search for query: {query}")
-    youtube = build(
-        config["YOUTUBE_API_SERVICE_NAME"],
-        config["YOUTUBE_API_VERSION"],
-        developerKey=dev_key
-    )
+    if service_factory is None:
+        service_factory = lambda: build(
+            config["YOUTUBE_API_SERVICE_NAME"],
+            config["YOUTUBE_API_VERSION"],
+            developerKey=dev_key
+        )
+    client = YoutubeClient(service_factory, TokenBucket(config["SEARCH_RATE_PER_S"]), QuotaBudget(config["SEARCH_QUOTA_UNITS"]))
+    search_queries = [f"{query} {suffix}" for suffix in SEARCH_SUFFIXES]
+    crawl = Crawl(client, query, config, title_check, search_queries)
 
     total_count = 0
     choices = []
+    seen = load_saved_ids(csv_file)
     create_folder_if_not_exists(config["CSV_FOLDER_PATH"])
-    search_queries = [f"{query} sound", f"{query} noise", f"{query} clip", f"{query} recording", f"{query} ambience"]
-
-    for search_term in search_queries:
-        logging.info(f"Searching for {search_term}...")
-
-        results = get_youtube_results(youtube, search_term, total_count, query, config)
-
-        for result in results:
-            if result['id']['kind'] == 'youtube#video' and not already_saved(result, choices):
-                choices.append(result)
-                logging.info(f"Video added: {result['snippet']['title']}")
-            total_count += 1
 
-        save_choices(choices, csv_file)
-        if total_count >= config["MAX_VIDEO_COUNT"]:
-            break
-
-    logging.info(f"Total analyzed: {total_count} videos. Total saved: {len(choices)} videos.")
+    choosers = ThreadPoolExecutor(max_workers=config["SEARCH_WORKERS"])
+    walkers = ThreadPoolExecutor(max_workers=len(search_queries))
+    try:
+        walks = [walkers.submit(get_youtube_results, crawl, search_term, choosers) for search_term in search_queries]
+        while True:
+            if stop is not None and stop.is_set():
+                logging.info("Crawl interrupted")
+                break
+            try:
+                search_term, results = crawl.results.get(timeout=0.1)
+            except queue.Empty:
+                if all(walk.done() for walk in walks) and crawl.idle():
+                    break
+                continue
+            try:
+                if isinstance(results, QuotaExceeded):
+                    logging.warning(f"{results}, stopping the crawl")
+                    crawl.stop.set()
+                    continue
+                if isinstance(results, CrawlStopped):
+                    continue
+                if isinstance(results, Exception):
+                    logging.error(f"Page of << {search_term} >> failed: {results}")
+                    continue
+
+                crawl.per_query[search_term] = crawl.per_query.get(search_term, 0) + len(results)
+                new = []
+                for result in results:
+                    total_count += 1
+                    video_id = result['id']['videoId']
+                    if video_id in seen or len(choices) >= config["MAX_VIDEO_COUNT"]:
+                        continue
+                    seen.add(video_id)
+                    choices.append(result)
+                    new.append(result)
+                    logging.info(f"Video added: {result['snippet']['title']}")
+                if new:
+                    save_choices(new, csv_file)
+                    if on_new is not None:
+                        on_new(new)
+                if len(choices) >= config["MAX_VIDEO_COUNT"]:
+                    crawl.full.set()
+                    crawl.stop.set()
+            finally:
+                # the walker of this query may search again only once the page is fully handled
+                crawl.done(search_term)
+        for walk in walks:
+            if walk.done():
+                walk.result()
+    finally:
+        crawl.full.set()
+        crawl.stop.set()
+        walkers.shutdown(wait=True)
+        # drop pages still queued (shutdown(cancel_futures=True) needs Python 3.9)
+        for future in crawl.futures:
+            future.cancel()
+        choosers.shutdown(wait=True)
+
+    logging.info(f"Total analyzed: {total_count} videos. Total saved: {len(choices)} videos. "
+                 f"Quota spent: {client.budget.spent}/{client.budget.units} units.")
+    return choices
 
 # Main scrawler function
 def scrawler(config, class_name):
@@ -205,6 +394,9 @@ if __name__ == "__main__":
         "YOUTUBE_API_VERSION": "v3",
         "VIDEO_PER_PAGE": 5,
         "MAX_VIDEO_COUNT": 100,
-        "RESULT_PER_QUERY": 10
+        "RESULT_PER_QUERY": 10,
+        "SEARCH_WORKERS": 4,
+        "SEARCH_RATE_PER_S": 5,
+        "SEARCH_QUOTA_UNITS": 10000
     }
     scrawler(config, "bird")
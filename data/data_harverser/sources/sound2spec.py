@@ -50,10 +50,13 @@ def make_spectral_dataset(sub_input_folder: str,
         if f.endswith('.wav') != True or len(f.split('.')) > 2:
             continue
         full_path = os.path.join(sub_input_folder, f)
+        # images are named after the clip, like the --pipeline stage, so both resume on the same files
+        if os.path.exists(os.path.join(sub_target_folder, f"sound_{f[:-4]}.png")):
+            continue
         with wave.open(full_path, 'rb') as audio_file:
             duration = audio_file.getnframes() / audio_file.getframerate()
             if duration == config["SAMPLE_AUDIO_DURATION"]:
-                sound_file_to_spectrogram(full_path, sub_target_folder, idx, f[:-4])
+                sound_file_to_spectrogram(full_path, sub_target_folder, f[:-4], f[:-4])
         idx += 1
 
 def create_folder_if_not_exists(folder_path):
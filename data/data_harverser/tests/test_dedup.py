@@ -0,0 +1,85 @@
+import os
+import json
+import wave
+import tempfile
+import itertools
+import unittest
+
+import numpy as np
+import librosa
+
+from sources.dedup import fingerprint, hamming, FingerprintIndex, FINGERPRINT_BITS
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+with open(CONFIG_PATH, 'r') as f:
+    CONFIG = json.load(f)
+SAMPLE_RATE = CONFIG["DEFAULT_SAMPLE_RATE"]
+DURATION = CONFIG["SAMPLE_AUDIO_DURATION"]
+
+def colored_noise(rng, exponent: float) -> np.ndarray:
+    """
+    Noise with a 1/f**exponent power spectrum: 0 white, 1 pink, 2 brown.
+    """
+    n = SAMPLE_RATE * DURATION
+    freqs = np.fft.rfftfreq(n, 1 / SAMPLE_RATE)
+    freqs[0] = freqs[1]
+    spectrum = np.fft.rfft(rng.standard_normal(n)) / freqs ** (exponent / 2)
+    signal = np.fft.irfft(spectrum, n)
+    return 0.5 * signal / np.abs(signal).max()
+
+def write_wav(path: str, signal: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+    return path
+
+def similarity(a: int, b: int) -> float:
+    return 1.0 - hamming(a, b) / FINGERPRINT_BITS
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def clip(self, name: str, signal: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+        return write_wav(os.path.join(self.tmp.name, name), signal, sample_rate)
+
+    def test_distinct_noise_clips_stay_below_threshold(self):
+        # independent recordings sharing a spectral tilt (rain, wind, ambience) are not duplicates
+        clips = {}
+        for kind, exponent in (("white", 0), ("pink", 1), ("brown", 2)):
+            for i in range(3):
+                name = f"{kind}_{i}.wav"
+                clips[name] = self.clip(name, colored_noise(self.rng, exponent))
+        fps = {name: fingerprint(path, SAMPLE_RATE) for name, path in clips.items()}
+        for a, b in itertools.combinations(fps, 2):
+            self.assertLess(similarity(fps[a], fps[b]), CONFIG["DEDUP_SIMILARITY"], f"{a} ~ {b}")
+        index = FingerprintIndex(os.path.join(self.tmp.name, "index.json"), CONFIG["DEDUP_SIMILARITY"])
+        for name, fp in fps.items():
+            self.assertFalse(index.check_and_add(name, fp), name)
+        self.assertEqual(index.dropped, 0)
+
+    def test_reencoded_clip_is_duplicate(self):
+        signal = colored_noise(self.rng, 1)
+        original = fingerprint(self.clip("original_1.wav", signal), SAMPLE_RATE)
+        quieter = fingerprint(self.clip("quieter_1.wav", 0.5 * signal), SAMPLE_RATE)
+        resampled = librosa.resample(signal, orig_sr=SAMPLE_RATE, target_sr=16000)
+        reencoded = fingerprint(self.clip("resampled_1.wav", resampled, 16000), SAMPLE_RATE)
+        self.assertGreaterEqual(similarity(original, quieter), CONFIG["DEDUP_SIMILARITY"])
+        self.assertGreaterEqual(similarity(original, reencoded), CONFIG["DEDUP_SIMILARITY"])
+
+    def test_retried_clip_is_not_its_own_duplicate(self):
+        fp = fingerprint(self.clip("title_1.wav", colored_noise(self.rng, 1)), SAMPLE_RATE)
+        index = FingerprintIndex(os.path.join(self.tmp.name, "index.json"), CONFIG["DEDUP_SIMILARITY"])
+        index.add("title_1.wav", fp)
+        self.assertFalse(index.is_duplicate("title_1.wav", fp))
+        self.assertTrue(index.is_duplicate("other_1.wav", fp))
+        self.assertEqual((index.kept, index.dropped), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+import pandas as pd
+
+from sources.scrawler import youtube_search, SEARCH_SUFFIXES, SEARCH_COST, VIDEOS_COST
+
+PER_PAGE = 25
+CONFIG = {
+    "VIDEO_PER_PAGE": PER_PAGE,
+    "MAX_VIDEO_COUNT": 50,
+    "RESULT_PER_QUERY": 1000,
+    "SEARCH_WORKERS": 4,
+    "SEARCH_RATE_PER_S": 1000,
+    "SEARCH_QUOTA_UNITS": 10000
+}
+
+class Calls:
+    """
+    Call counts shared by the fake services of every crawl thread.
+    """
+    def __init__(self) -> None:
+        self.searches = 0
+        self.videos = 0
+        self.lock = threading.Lock()
+
+    def add(self, kind: str) -> None:
+        with self.lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    @property
+    def units(self) -> int:
+        return self.searches * SEARCH_COST + self.videos * VIDEOS_COST
+
+class Request:
+    def __init__(self, response) -> None:
+        self.response = response
+
+    def execute(self) -> dict:
+        return self.response()
+
+class FakeSearch:
+    """
+    Endless result pages of PER_PAGE videos, ids unique across queries and pages.
+    """
+    def __init__(self, calls: Calls) -> None:
+        self.calls = calls
+
+    def list(self, q, part, maxResults, pageToken=None):
+        def response():
+            self.calls.add("searches")
+            page = int(pageToken or 0)
+            items = [{"id": {"kind": "youtube#video", "videoId": f"{q}-{page}-{n}"},
+                      "snippet": {"title": f"{q} {page} {n}", "description": ""}}
+                     for n in range(maxResults)]
+            return {"items": items, "nextPageToken": str(page + 1)}
+        return Request(response)
+
+class FakeVideos:
+    def __init__(self, calls: Calls) -> None:
+        self.calls = calls
+
+    def list(self, part, id):
+        def response():
+            self.calls.add("videos")
+            return {"items": [{"id": video_id, "contentDetails": {"duration": "PT2M"}} for video_id in id.split(",")]}
+        return Request(response)
+
+class FakeService:
+    def __init__(self, calls: Calls) -> None:
+        self.calls = calls
+
+    def search(self) -> FakeSearch:
+        return FakeSearch(self.calls)
+
+    def videos(self) -> FakeVideos:
+        return FakeVideos(self.calls)
+
+def accept_all(title: str, query: str) -> bool:
+    return True
+
+class YoutubeSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.tmp.name, "bird.csv")
+        self.calls = Calls()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def search(self, title_check=accept_all, stop=None, **overrides):
+        config = dict(CONFIG, CSV_FOLDER_PATH=self.tmp.name, **overrides)
+        return youtube_search("bird", self.csv_file, config, service_factory=lambda: FakeService(self.calls),
+                              title_check=title_check, stop=stop)
+
+    def test_stops_searching_at_max_video_count(self):
+        choices = self.search()
+        self.assertEqual(len(choices), CONFIG["MAX_VIDEO_COUNT"])
+        # two pages reach the limit: the first page of every query, plus at most one follow-up page
+        # searched once the first handled page released its query (the old crawl made 39 calls)
+        pages_needed = CONFIG["MAX_VIDEO_COUNT"] // PER_PAGE
+        self.assertLessEqual(self.calls.searches, len(SEARCH_SUFFIXES) + pages_needed - 1)
+        self.assertLessEqual(self.calls.videos, self.calls.searches)
+        saved = pd.read_csv(self.csv_file)
+        self.assertEqual(len(saved), CONFIG["MAX_VIDEO_COUNT"])
+        self.assertEqual(saved["id"].nunique(), len(saved))
+
+    def test_stops_when_quota_is_spent(self):
+        choices = self.search(MAX_VIDEO_COUNT=10000, SEARCH_QUOTA_UNITS=1000)
+        self.assertLessEqual(self.calls.units, 1000)
+        # 9 searches and their 9 videos calls fit in 1000 units, a 10th search does not
+        self.assertEqual(self.calls.searches, 9)
+        # pages fetched before the quota ran out are still classified and saved
+        self.assertEqual(len(choices), self.calls.searches * PER_PAGE)
+
+    def test_stop_event_ends_the_crawl(self):
+        stop = threading.Event()
+
+        def slow_check(title: str, query: str) -> bool:
+            time.sleep(0.05)
+            return True
+
+        timer = threading.Timer(0.3, stop.set)
+        timer.start()
+        start = time.monotonic()
+        try:
+            choices = self.search(title_check=slow_check, stop=stop)
+        finally:
+            timer.cancel()
+        # classifying every first page alone would take 25 * 0.05s per query
+        self.assertLess(time.monotonic() - start, 2.0)
+        self.assertLess(len(choices), CONFIG["MAX_VIDEO_COUNT"])
+        self.assertLessEqual(self.calls.searches, len(SEARCH_SUFFIXES))
+
+if __name__ == "__main__":
+    unittest.main()
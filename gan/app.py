@@ -1,23 +1,158 @@
 #!/usr/bin python3
 
+import os
+import math
+import time
+import asyncio
+import secrets
+import logging
+import threading
 import torch
-from sources.inference import inference
+from sources.inference import generate_spectrogram, warm_up_generator, make_latent, resolve_model, VOCODER_PARAMS
 from sources.config_loader import Config
-from fastapi import FastAPI
+from sources.worker_pool import VocoderPool
+from sources.result_cache import ResultCache, cache_key
+from sources.metrics import render_metrics, CONTENT_TYPE, REQUESTS, ERRORS, REJECTED, CACHE_HITS, IN_FLIGHT, REQUEST_LATENCY
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, JSONResponse
 import uvicorn
 
 app = FastAPI()
+state = {"ready": False, "error": "", "config": None, "device": None, "pool": None, "cache": None}
+
+def warm_up_model() -> None:
+    try:
+        config = Config()
+        config.load_config('gan_config.json')
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "mps")
+        state["config"] = config
+        state["device"] = device
+        warm_up_generator(device, config)
+        state["cache"] = ResultCache(config.cache_dir,
+                                     config.cache_memory_mb * 1024 * 1024,
+                                     config.cache_disk_mb * 1024 * 1024)
+        pool = VocoderPool(config.infer_workers or os.cpu_count() or 1, config.infer_queue_depth)
+        pool.warm_up()
+        state["pool"] = pool
+        state["ready"] = True
+    except Exception as e:
+        logging.exception("Model warm-up failed")
+        state["error"] = str(e)
+
+# warm up in the background so the process is live immediately and only /ready waits on the model
+@app.on_event("startup")
+def start_warm_up() -> None:
+    threading.Thread(target=warm_up_model, daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_pool() -> None:
+    if state["pool"] is not None:
+        state["pool"].shutdown()
+
+def error_response(message: str, status_code: int, headers=None) -> JSONResponse:
+    return JSONResponse({"output_path": "", "error": message}, status_code=status_code, headers=headers)
+
+def retry_after(pool: VocoderPool) -> int:
+    # time for the workers to drain what is already queued, from the observed request latency
+    mean = REQUEST_LATENCY.mean() or 1.0
+    return max(1, math.ceil(mean * pool.pending / pool.workers))
+
+def write_output(output_file: str, data: bytes) -> None:
+    with open(output_file, 'wb') as f:
+        f.write(data)
+
+def cache_output(cache: ResultCache, key: str, output_file: str) -> None:
+    with open(output_file, 'rb') as f:
+        cache.put(key, f.read())
+
+async def check_deadline(request: Request, end: float) -> None:
+    if asyncio.get_running_loop().time() >= end or await request.is_disconnected():
+        raise asyncio.TimeoutError()
+
+async def wait_for_job(request: Request, future, end: float):
+    """
+    Await an executor or pool job, cancelling it when the request deadline (loop time) passes or the client goes away.
+    Jobs still queued are dropped; a job already running finishes but its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    result = asyncio.wrap_future(future)
+    while True:
+        remaining = end - loop.time()
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout=min(0.5, max(remaining, 0)))
+        except asyncio.TimeoutError:
+            if remaining <= 0.5 or await request.is_disconnected():
+                future.cancel()
+                raise
 
 @app.post("/infer")
-def infer(input_data: dict):
-    config = Config()
-    config.load_config('gan_config.json')
-    device = torch.device("cuda:0" if torch.cuda.is_available() else "mps")
+async def infer(input_data: dict, request: Request):
+    if not state["ready"]:
+        return error_response("model is not ready", 503)
+    config, device, pool, cache = state["config"], state["device"], state["pool"], state["cache"]
+    REQUESTS.inc()
+    loop = asyncio.get_running_loop()
+    # the deadline covers the whole request: model load, generator forward and vocoder
+    end = loop.time() + input_data.get("deadline_s", config.infer_deadline_s)
+    output_file = input_data["output_file"]
+    # no seed given: draw one and return it so the sound can be requested again
+    seed = input_data.get("seed")
+    if seed is None and input_data.get("latent") is None:
+        seed = secrets.randbits(63)
+    class_name, version = input_data.get("class"), input_data.get("version")
     try:
-        inference(device, config, input_data["output_file"], prod=True)
+        z = make_latent(config.nz, seed, input_data.get("latent"))
+        # hashing a model not seen yet reads the whole artifact, keep it off the event loop
+        _, _, checksum = await loop.run_in_executor(None, resolve_model, config, device, class_name, version)
+    except KeyError as e:
+        ERRORS.inc("UnknownModel")
+        return error_response(e.args[0], 404)
+    except (ValueError, TypeError) as e:
+        ERRORS.inc(type(e).__name__)
+        return error_response(str(e), 400)
+    # the key holds exactly the parameters the render below uses
+    key = cache_key(checksum, z, dict(VOCODER_PARAMS, original_image_size=config.original_image_size))
+    data = await loop.run_in_executor(None, cache.get, key)
+    if data is not None:
+        CACHE_HITS.inc()
+        await loop.run_in_executor(None, write_output, output_file, data)
+        return {"output_path": output_file, "error": "", "seed": seed, "cached": True}
+    if not pool.try_acquire():
+        REJECTED.inc()
+        return error_response("inference queue is full", 429, {"Retry-After": str(retry_after(pool))})
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    submitted = False
+    try:
+        img = await wait_for_job(request, loop.run_in_executor(None, generate_spectrogram, device, config, z, class_name, version), end)
+        await check_deadline(request, end)
+        future = pool.submit_render(img, config.original_image_size, output_file, VOCODER_PARAMS)
+        submitted = True
+        await wait_for_job(request, future, end)
+        await loop.run_in_executor(None, cache_output, cache, key, output_file)
+    except asyncio.TimeoutError:
+        ERRORS.inc("DeadlineExceeded")
+        return error_response("deadline exceeded", 504)
     except Exception as e:
+        ERRORS.inc(type(e).__name__)
         return {"output_path": "", "error": str(e)}
-    return {"output_path": input_data["output_file"], "error": ""}
+    finally:
+        if not submitted:
+            pool.release()
+        REQUEST_LATENCY.observe(time.perf_counter() - start)
+        IN_FLIGHT.dec()
+    return {"output_path": output_file, "error": "", "seed": seed, "cached": False}
+
+@app.get("/ready")
+async def ready():
+    if not state["ready"]:
+        return JSONResponse({"ready": False, "error": state["error"]}, status_code=503)
+    return {"ready": True, "error": ""}
+
+# async so scrapes are answered on the event loop, never queued behind /infer
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
-    uvicorn.run(debug=True, port=5050, host="0.0.0.0")
\ No newline at end of file
+    uvicorn.run(debug=True, port=5050, host="0.0.0.0")
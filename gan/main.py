@@ -2,23 +2,36 @@
 
 import argparse
 import torch
-from sources.training import training
-from sources.inference import inference
 from sources.config_loader import Config
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--training', action='store_true', help='Training mode.')
 parser.add_argument('--inference', action='store_true', help='Inference mode.')
+parser.add_argument('--sweep', help='Run a hyperparameter sweep described by this JSON file.')
+parser.add_argument('--convert', help='Convert a model_G.pt or checkpoint_G_N.pt to the mmap weight format.')
+parser.add_argument('--publish', help='Publish the trained model_G.pt to the model registry under this sound class.')
 args = parser.parse_args()
 
 def main():
     config = Config()
     config.load_config('gan_config.json')
     device = torch.device("cuda:0" if torch.cuda.is_available() else "mps")
+    # imported per mode so inference does not pay for mlflow/torchvision and training not for librosa
     if args.inference:
+        from sources.inference import inference
         inference(device, config, "output.wav")
     elif args.training:
+        from sources.training import training
         training(device, config)
+    elif args.sweep:
+        from sources.sweep import sweep
+        sweep(config, args.sweep)
+    elif args.convert:
+        from sources.weights import convert_checkpoint
+        print(f"Converted to {convert_checkpoint(args.convert, config)}")
+    elif args.publish:
+        from sources.model_registry import publish_model
+        print(f"Published {publish_model(f'{config.saveroot}/model_G.pt', config.registry_root, args.publish)}")
     else:
         print("Please specify training or inference mode. --training or --inference")
 
@@ -21,6 +21,28 @@ class Config:
         self.noise_decay_rate = None
         self.dev_notifier_keys = None
         self.dev_mail_address = None
+        self.profile_phases = None
+        self.profiler_skip_steps = None
+        self.profiler_record_steps = None
+        self.infer_workers = None
+        self.infer_queue_depth = None
+        self.infer_deadline_s = None
+        self.cache_dir = None
+        self.cache_memory_mb = None
+        self.cache_disk_mb = None
+        self.registry_root = None
+        self.default_class = None
+        self.model_memory_mb = None
+        self.eval_every_epochs = None
+        self.eval_samples = None
+        self.eval_patience = None
+        self.eval_stats_dir = None
+        self.snapshot_keep = None
+        self.snapshot_to_mlflow = None
+        self.notify_endpoint = None
+        self.notify_every_epochs = None
+        self.progressive_schedule = None
+        self.progressive_fade_epochs = None
 
     def load_config(self, config_path):
         with open(config_path, 'r') as f:
@@ -43,4 +65,26 @@ class Config:
         self.initial_noise_std = config.get('initial_noise_std')
         self.noise_decay_rate = config.get('noise_decay_rate')
         self.dev_notifier_keys = config.get('dev_notifier_keys')
-        self.dev_mail_address = config.get('dev_mail_address')
\ No newline at end of file
+        self.dev_mail_address = config.get('dev_mail_address')
+        self.profile_phases = config.get('profile_phases', False)
+        self.profiler_skip_steps = config.get('profiler_skip_steps', 0)
+        self.profiler_record_steps = config.get('profiler_record_steps', 0)
+        self.infer_workers = config.get('infer_workers', 0)
+        self.infer_queue_depth = config.get('infer_queue_depth', 8)
+        self.infer_deadline_s = config.get('infer_deadline_s', 60)
+        self.cache_dir = config.get('cache_dir', './cache')
+        self.cache_memory_mb = config.get('cache_memory_mb', 64)
+        self.cache_disk_mb = config.get('cache_disk_mb', 1024)
+        self.registry_root = config.get('registry_root', './save/models')
+        self.default_class = config.get('default_class')
+        self.model_memory_mb = config.get('model_memory_mb', 2048)
+        self.eval_every_epochs = config.get('eval_every_epochs', 0)
+        self.eval_samples = config.get('eval_samples', 512)
+        self.eval_patience = config.get('eval_patience', 0)
+        self.eval_stats_dir = config.get('eval_stats_dir', None)
+        self.snapshot_keep = config.get('snapshot_keep', 4)
+        self.snapshot_to_mlflow = config.get('snapshot_to_mlflow', True)
+        self.notify_endpoint = config.get('notify_endpoint', 'https://api.mynotifier.app')
+        self.notify_every_epochs = config.get('notify_every_epochs', 0)
+        self.progressive_schedule = config.get('progressive_schedule', [])
+        self.progressive_fade_epochs = config.get('progressive_fade_epochs', 0)
\ No newline at end of file
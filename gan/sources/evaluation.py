@@ -0,0 +1,140 @@
+import os
+import hashlib
+
+import torch
+import torch.nn.functional as F
+
+# bump when band_features changes so cached statistics are recomputed
+FEATURE_VERSION = 1
+N_BANDS = 32
+
+def band_features(images: torch.Tensor) -> torch.Tensor:
+    """
+    Mel-band energy features of spectrogram images (B, C, H, W): per band, mean and spread over time.
+    Image rows are the mel axis, so pooling rows to N_BANDS gives coarse band energies.
+    """
+    bands = F.adaptive_avg_pool2d(images, (N_BANDS, images.size(3)))
+    mean = bands.mean(dim=3)
+    std = bands.std(dim=3)
+    return torch.cat([mean.flatten(1), std.flatten(1)], dim=1).double()
+
+class RunningStats:
+    """
+    Streaming mean/covariance in float64.
+    """
+    def __init__(self) -> None:
+        self.n = 0
+        self.total = None
+        self.outer = None
+
+    def update(self, features: torch.Tensor) -> None:
+        features = features.cpu()
+        if self.total is None:
+            self.total = torch.zeros(features.size(1), dtype=torch.float64)
+            self.outer = torch.zeros(features.size(1), features.size(1), dtype=torch.float64)
+        self.n += features.size(0)
+        self.total += features.sum(dim=0)
+        self.outer += features.t() @ features
+
+    def finalize(self) -> tuple:
+        mu = self.total / self.n
+        sigma = (self.outer - self.n * torch.outer(mu, mu)) / max(self.n - 1, 1)
+        return mu, sigma
+
+def _sqrt_psd(matrix: torch.Tensor) -> torch.Tensor:
+    eigvals, eigvecs = torch.linalg.eigh(matrix)
+    return eigvecs @ torch.diag(eigvals.clamp(min=0).sqrt()) @ eigvecs.t()
+
+def frechet_distance(mu1, sigma1, mu2, sigma2) -> float:
+    """
+    Fréchet distance between two Gaussians, as in FID.
+    tr(sqrt(S1 S2)) is computed as the trace of sqrt(sqrt(S1) S2 sqrt(S1)), which stays symmetric.
+    """
+    root1 = _sqrt_psd(sigma1)
+    middle = root1 @ sigma2 @ root1
+    trace_sqrt = torch.linalg.eigvalsh((middle + middle.t()) / 2).clamp(min=0).sqrt().sum()
+    diff = mu1 - mu2
+    return float(diff @ diff + torch.trace(sigma1) + torch.trace(sigma2) - 2 * trace_sqrt)
+
+def dataset_version(config) -> str:
+    """
+    Fingerprint of dataroot (paths, sizes, mtimes) and of the preprocessing, keys the statistics cache.
+    """
+    digest = hashlib.sha256(f"{FEATURE_VERSION}:{config.image_size}".encode())
+    for root, dirs, files in os.walk(config.dataroot):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, config.dataroot)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+def real_statistics(config, dataloader, device) -> tuple:
+    """
+    Mean/covariance of real-data features, computed once per dataset version and cached
+    under eval_stats_dir (saveroot when unset).
+    """
+    stats_dir = config.eval_stats_dir or config.saveroot
+    cache_path = f"{stats_dir}/eval_stats_{dataset_version(config)}.pt"
+    if os.path.exists(cache_path):
+        cached = torch.load(cache_path)
+        return cached["mu"], cached["sigma"]
+    stats = RunningStats()
+    with torch.no_grad():
+        for data in dataloader:
+            stats.update(band_features(data[0].to(device)))
+    mu, sigma = stats.finalize()
+    os.makedirs(stats_dir, exist_ok=True)
+    torch.save({"mu": mu, "sigma": sigma}, cache_path)
+    return mu, sigma
+
+class QualityEvaluator:
+    """
+    Compares generated samples against cached real statistics every eval_every_epochs epochs,
+    keeps the best generator weights and signals when eval_patience evaluations brought no improvement.
+    """
+    def __init__(self, config, device) -> None:
+        self.config = config
+        self.device = device
+        self.real = None
+        self.best = None
+        self.best_epoch = -1
+        self.stale = 0
+
+    def due(self, epoch: int) -> bool:
+        every = self.config.eval_every_epochs or 0
+        return every > 0 and (epoch + 1) % every == 0
+
+    def evaluate(self, netG, dataloader) -> float:
+        if self.real is None:
+            self.real = real_statistics(self.config, dataloader, self.device)
+        stats = RunningStats()
+        remaining = self.config.eval_samples
+        was_training = netG.training
+        netG.eval()
+        with torch.no_grad():
+            while remaining > 0:
+                b_size = min(remaining, self.config.batch_size)
+                noise = torch.randn(b_size, self.config.nz, 1, 1, device=self.device)
+                stats.update(band_features(netG(noise)))
+                remaining -= b_size
+        netG.train(was_training)
+        mu, sigma = stats.finalize()
+        return frechet_distance(self.real[0], self.real[1], mu, sigma)
+
+    def step(self, epoch: int, distance: float, netG) -> bool:
+        """
+        Record an evaluation, save best_G.pt on improvement. Returns True when this epoch is the new best.
+        """
+        if self.best is None or distance < self.best:
+            self.best = distance
+            self.best_epoch = epoch
+            self.stale = 0
+            torch.save(netG.state_dict(), f"{self.config.saveroot}/checkpoints/best_G.pt")
+            return True
+        self.stale += 1
+        return False
+
+    def should_stop(self) -> bool:
+        patience = self.config.eval_patience or 0
+        return patience > 0 and self.stale >= patience
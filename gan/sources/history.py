@@ -0,0 +1,73 @@
+import os
+import queue
+import threading
+from array import array
+from collections import deque
+
+import numpy as np
+import torchvision.utils as vutils
+
+class LossHistory:
+    """
+    Append-only float32 buffer for per-iteration losses, 4 bytes per value instead of a Python float object.
+    """
+    def __init__(self) -> None:
+        self.values = array('f')
+
+    def append(self, value: float) -> None:
+        self.values.append(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        return self.values[idx]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.frombuffer(self.values, dtype=np.float32).astype(dtype or np.float32)
+
+class SnapshotStore:
+    """
+    Sample grids taken during training. Only the last `keep` grids stay in memory,
+    every grid is written to saveroot/snapshots (and optionally logged to MLflow) by a background thread.
+    """
+    def __init__(self, directory: str, keep: int = 4, mlflow_run_id=None) -> None:
+        self.directory = directory
+        self.recent = deque(maxlen=keep)
+        self.mlflow_run_id = mlflow_run_id
+        self.queue = queue.Queue(maxsize=max(keep, 1) * 2)
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def _writer(self) -> None:
+        client = None
+        if self.mlflow_run_id is not None:
+            from mlflow.tracking import MlflowClient
+            client = MlflowClient()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            name, grid = item
+            try:
+                path = os.path.join(self.directory, name)
+                vutils.save_image(grid, path)
+                if client is not None:
+                    client.log_artifact(self.mlflow_run_id, path, "snapshots")
+            except Exception as e:
+                print(f"Snapshot {name} not saved: {e}")
+            finally:
+                self.queue.task_done()
+
+    def add(self, grid, iteration: int) -> None:
+        self.recent.append(grid)
+        self.queue.put((f"iter_{iteration:07d}.png", grid))
+
+    def latest(self):
+        return self.recent[-1] if self.recent else None
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
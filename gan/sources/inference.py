@@ -1,24 +1,35 @@
 #!/usr/bin python3
 
-import matplotlib.pyplot as plt
-import librosa
 import torch
 import numpy as np
-import cv2
-from scipy.io.wavfile import write
 
-def mel_to_waveform(S_dB, sr=22050, n_fft=1024, hop_length=512):
+from sources.metrics import stage
+from sources.model_registry import ModelRegistry, model_checksum
+
+# librosa, cv2, scipy and matplotlib are imported inside the functions using them:
+# they dominate import time and the service pays for them during warm-up, not at import.
+
+# everything that shapes the WAV after the generator, part of the result cache key
+# random_state fixes Griffin-Lim's random phase init so a latent always renders the same WAV
+VOCODER_PARAMS = {"sr": 22050, "n_fft": 1024, "hop_length": 512, "n_iter": 256, "random_state": 0}
+
+_registry = None
+
+def mel_to_waveform(S_dB, sr=22050, n_fft=1024, hop_length=512, n_iter=256, random_state=0):
+    import librosa
     S_power = librosa.db_to_power(S_dB)
     linear_spectrogram = librosa.feature.inverse.mel_to_stft(S_power, sr=sr, n_fft=n_fft)
-    waveform = librosa.griffinlim(linear_spectrogram, hop_length=hop_length, n_iter=256)
+    waveform = librosa.griffinlim(linear_spectrogram, hop_length=hop_length, n_iter=n_iter, random_state=random_state)
     return waveform
 
-def spectrogram_to_wav(img, output_path, sr=22050, hop_length=512, n_fft=1024):
+def spectrogram_to_wav(img, output_path, sr=22050, hop_length=512, n_fft=1024, n_iter=256, random_state=0):
+    from scipy.io.wavfile import write
     img = img.astype(np.float32)
     img = (img - img.min()) / (img.max() - img.min()) 
     # Convert to mel spectrogram
     S_dB = (img * 80.0) - 80.0 
-    waveform = mel_to_waveform(S_dB, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    with stage("griffin_lim"):
+        waveform = mel_to_waveform(S_dB, sr=sr, n_fft=n_fft, hop_length=hop_length, n_iter=n_iter, random_state=random_state)
     if len(waveform.shape) > 1 and waveform.shape[0] > 1:
         waveform = np.mean(waveform, axis=0)
     max_val = np.max(np.abs(waveform))
@@ -27,22 +38,88 @@ def spectrogram_to_wav(img, output_path, sr=22050, hop_length=512, n_fft=1024):
     # make array contiguous
     scaled_waveform = np.ascontiguousarray(scaled_waveform)
     # Save
-    write(output_path, sr, scaled_waveform)
+    with stage("wav_write"):
+        write(output_path, sr, scaled_waveform)
 
-def inference(device, config, output_file="output.wav", prod=False):
-    netG = torch.load(f"{config.saveroot}/model_G.pt", map_location=device)
-    netG = netG.to(device)
-    netG.eval()
+def make_latent(nz: int, seed=None, latent=None) -> torch.Tensor:
+    """
+    Latent vector on CPU, either given explicitly or drawn from a seeded generator so it is reproducible
+    """
+    if latent is not None:
+        z = torch.tensor(latent, dtype=torch.float32)
+        if z.numel() != nz:
+            raise ValueError(f"latent must have {nz} values, got {z.numel()}")
+        return z.view(1, nz, 1, 1)
+    generator = torch.Generator()
+    generator.manual_seed(int(seed))
+    return torch.randn(1, nz, 1, 1, generator=generator)
+
+def get_registry(config, device) -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(config, device, config.model_memory_mb * 1024 * 1024)
+    return _registry
+
+def resolve_model(config, device, class_name=None, version=None) -> tuple:
+    """
+    (class_name, version, checksum) of the generator a request for class_name/version is served by
+    """
+    class_name, version, path = get_registry(config, device).resolve(class_name, version)
+    return class_name, version, model_checksum(path)
+
+def load_generator(config, device, class_name=None, version=None):
+    return get_registry(config, device).get(class_name, version)
+
+def warm_up_generator(device, config) -> None:
+    """
+    Load and warm the default generator so the first request does not pay for it.
+    Raises when there is none, so the service never reports ready without a warmed model
+    """
+    registry = get_registry(config, device)
+    try:
+        registry.resolve()
+    except KeyError as e:
+        raise RuntimeError(f"nothing to warm up ({e.args[0]}): set default_class or provide {config.saveroot}/model_G") from e
+    registry.get()
+
+def warm_up_vocoder() -> None:
+    """
+    Import librosa/cv2/scipy and JIT-compile Griffin-Lim on a tiny spectrogram
+    """
+    import cv2
+    from scipy.io import wavfile
+    mel_to_waveform(np.full((128, 8), -40.0, dtype=np.float32))
+
+def generate_spectrogram(device, config, z=None, class_name=None, version=None) -> np.ndarray:
+    with stage("model_load"):
+        netG = load_generator(config, device, class_name, version)
     b_size = 1
-    z = torch.randn(b_size, config.nz, 1, 1, device=device)  # Random latent vector
-    imgs = netG(z)
-    imgs = imgs.cpu().detach().numpy()
-    img = imgs[0]
-    img = cv2.resize(img,
-                    (config.original_image_size[1], config.original_image_size[0]),
-                    interpolation=cv2.INTER_CUBIC)
-    spectrogram_to_wav(img[0], output_file)
+    with stage("generator"):
+        if z is None:
+            z = torch.randn(b_size, config.nz, 1, 1, device=device)  # Random latent vector
+        z = z.to(device)
+        with torch.no_grad():
+            imgs = netG(z)
+        imgs = imgs.cpu().detach().numpy()
+    return imgs[0]
+
+def render_wav(img, original_image_size, output_file="output.wav", params=VOCODER_PARAMS) -> np.ndarray:
+    """
+    CPU-bound half of inference: resize to the original spectrogram size, Griffin-Lim, write WAV
+    """
+    import cv2
+    with stage("resize"):
+        img = cv2.resize(img,
+                        (original_image_size[1], original_image_size[0]),
+                        interpolation=cv2.INTER_CUBIC)
+    spectrogram_to_wav(img[0], output_file, **params)
+    return img
+
+def inference(device, config, output_file="output.wav", prod=False):
+    img = generate_spectrogram(device, config)
+    img = render_wav(img, config.original_image_size, output_file)
     if prod == False:
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(config.original_image_size[0] / 100, config.original_image_size[1] / 100), dpi=100)
         plt.imshow(img[0], cmap='viridis', aspect='auto')
         plt.axis('off')
@@ -0,0 +1,197 @@
+import os
+import time
+import bisect
+import resource
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(label, value, extra=""):
+    parts = []
+    if label is not None:
+        parts.append(f'{label}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Timer:
+    def __init__(self, histogram, value):
+        self.histogram = histogram
+        self.value = value
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, self.value)
+        return False
+
+class Counter:
+    """
+    Monotonic counter, optionally split by a single label.
+    """
+    def __init__(self, name: str, description: str, label=None) -> None:
+        self.name = name
+        self.description = description
+        self.label = label
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=None, amount=1) -> None:
+        with self.lock:
+            self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self) -> list:
+        with self.lock:
+            values = dict(self.values)
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for value, count in values.items():
+            lines.append(f"{self.name}{_format_labels(self.label, value)} {count}")
+        return lines
+
+class Gauge:
+    """
+    Value that goes up and down, such as in-flight requests.
+    """
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1) -> None:
+        self.inc(-amount)
+
+    def set(self, value) -> None:
+        with self.lock:
+            self.value = value
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram, optionally split by a single label.
+    observe() is a bisect and three increments under a lock, cheap enough to stay on in production.
+    """
+    def __init__(self, name: str, description: str, label=None, buckets=DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, value=None) -> None:
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.series.get(value)
+            if series is None:
+                series = self.series[value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def time(self, value=None) -> _Timer:
+        return _Timer(self, value)
+
+    def mean(self, value=None) -> float:
+        with self.lock:
+            series = self.series.get(value)
+            return series[1] / series[2] if series else 0.0
+
+    def take(self) -> dict:
+        """
+        Return and reset the raw series, used to ship observations out of worker processes.
+        """
+        with self.lock:
+            series, self.series = self.series, {}
+        return series
+
+    def merge(self, series: dict) -> None:
+        with self.lock:
+            for value, (counts, total, count) in series.items():
+                mine = self.series.get(value)
+                if mine is None:
+                    mine = self.series[value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                mine[1] += total
+                mine[2] += count
+
+    def render(self) -> list:
+        # copy under the lock, format outside it so scrapes never hold up observers
+        with self.lock:
+            snapshot = {value: (list(s[0]), s[1], s[2]) for value, s in self.series.items()}
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for value, (counts, total, count) in snapshot.items():
+            cumulative = 0
+            labels = _format_labels(self.label, value)
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.label, value, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.label, value, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+STAGE_LATENCY = Histogram("soundgan_stage_latency_seconds", "Latency of each inference pipeline stage.", label="stage")
+REQUEST_LATENCY = Histogram("soundgan_request_latency_seconds", "End-to-end /infer latency.")
+REQUESTS = Counter("soundgan_requests_total", "Inference requests received.")
+ERRORS = Counter("soundgan_errors_total", "Inference requests that failed, by exception type.", label="type")
+IN_FLIGHT = Gauge("soundgan_requests_in_flight", "Inference requests currently being processed.")
+POOL_PENDING = Gauge("soundgan_pool_pending", "Vocoder jobs queued or running in the process pool.")
+CACHE_HITS = Counter("soundgan_cache_hits_total", "Requests served from the result cache.")
+REJECTED = Counter("soundgan_rejected_total", "Requests refused with 429 because the queue was full.")
+
+RESIDENT_MODEL_BYTES = Gauge("soundgan_models_resident_bytes", "Memory held by loaded generators.")
+
+_models = {}
+_models_lock = threading.Lock()
+
+def set_model_version(class_name: str, version: str, checksum: str) -> None:
+    with _models_lock:
+        _models[(class_name, version)] = checksum
+
+def drop_model_version(class_name: str, version: str) -> None:
+    with _models_lock:
+        _models.pop((class_name, version), None)
+
+def process_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # peak rather than current RSS, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def stage(name: str) -> _Timer:
+    return STAGE_LATENCY.time(name)
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (REQUESTS, ERRORS, REJECTED, CACHE_HITS, IN_FLIGHT, POOL_PENDING, REQUEST_LATENCY, STAGE_LATENCY):
+        lines.extend(metric.render())
+    lines.extend(RESIDENT_MODEL_BYTES.render())
+    lines.extend([
+        "# HELP soundgan_model_info Generator artifacts currently loaded.",
+        "# TYPE soundgan_model_info gauge",
+    ])
+    with _models_lock:
+        models = dict(_models)
+    for (class_name, version), checksum in models.items():
+        lines.append(f'soundgan_model_info{{class="{class_name}",version="{version}",checksum="{checksum}"}} 1')
+    lines.extend([
+        "# HELP process_resident_memory_bytes Resident memory size in bytes.",
+        "# TYPE process_resident_memory_bytes gauge",
+        f"process_resident_memory_bytes {process_rss_bytes()}",
+    ])
+    return "\n".join(lines) + "\n"
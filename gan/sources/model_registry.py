@@ -0,0 +1,164 @@
+import os
+import re
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+from sources.metrics import set_model_version, drop_model_version, RESIDENT_MODEL_BYTES
+from sources.weights import load_weights
+
+_NAME = re.compile(r'^[A-Za-z0-9_\-]+$')
+_checksums = {}
+
+def model_checksum(path: str) -> str:
+    """
+    sha256 of a model file, cached on (mtime, size) so it is only hashed once per artifact
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _checksums:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _checksums[key] = digest.hexdigest()
+    return _checksums[key]
+
+def _natural_key(name: str) -> list:
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+def _check_name(kind: str, name: str) -> None:
+    if not _NAME.match(name):
+        raise ValueError(f"invalid {kind}: {name!r}")
+
+def model_bytes(model: torch.nn.Module) -> int:
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def artifact_path(prefix: str) -> str:
+    """
+    Prefer the mmap weight format (prefix.json) over the pickled module (prefix.pt)
+    """
+    if os.path.exists(f"{prefix}.json"):
+        return f"{prefix}.json"
+    return f"{prefix}.pt"
+
+def publish_model(model_path: str, registry_root: str, class_name: str, version=None) -> str:
+    """
+    Copy a trained model_G.pt, and its .json/.weights conversion when present,
+    to registry_root/<class>/<version>/, defaulting to the next vN
+    """
+    _check_name("class", class_name)
+    class_dir = os.path.join(registry_root, class_name)
+    if version is None:
+        existing = os.listdir(class_dir) if os.path.isdir(class_dir) else []
+        numbers = [int(v[1:]) for v in existing if re.match(r'^v\d+$', v)]
+        version = f"v{max(numbers, default=0) + 1}"
+    _check_name("version", version)
+    target = os.path.join(class_dir, version, "model_G.pt")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(model_path, target)
+    prefix = os.path.splitext(model_path)[0]
+    for ext in (".weights", ".json"):
+        if os.path.exists(prefix + ext):
+            shutil.copyfile(prefix + ext, os.path.join(class_dir, version, "model_G" + ext))
+    return target
+
+class ModelRegistry:
+    """
+    Maps (sound class, version) to generator artifacts laid out as registry_root/<class>/<version>/model_G.{json,pt}.
+    Requests without a class use default_class, or the legacy saveroot/model_G.pt when that is unset.
+    Generators are loaded and warmed on first use and kept in an LRU bounded by memory_bytes.
+    """
+    def __init__(self, config, device, memory_bytes: int) -> None:
+        self.config = config
+        self.device = device
+        self.root = config.registry_root
+        self.default_class = config.default_class
+        self.memory_bytes = memory_bytes
+        self.models = OrderedDict()
+        self.used = 0
+        self.lock = threading.Lock()
+        self.loading = {}
+
+    def resolve(self, class_name=None, version=None) -> tuple:
+        """
+        Return (class_name, version, path) of the artifact to serve, raises KeyError when it does not exist.
+        """
+        class_name = class_name or self.default_class
+        if class_name is None:
+            path = artifact_path(f"{self.config.saveroot}/model_G")
+            if not os.path.exists(path):
+                raise KeyError("no default model")
+            return "default", "latest", path
+        _check_name("class", class_name)
+        class_dir = os.path.join(self.root, class_name)
+        if not os.path.isdir(class_dir):
+            raise KeyError(f"unknown sound class {class_name}")
+        if version is None:
+            versions = sorted(os.listdir(class_dir), key=_natural_key)
+            if not versions:
+                raise KeyError(f"no model published for {class_name}")
+            version = versions[-1]
+        _check_name("version", version)
+        path = artifact_path(os.path.join(class_dir, version, "model_G"))
+        if not os.path.exists(path):
+            raise KeyError(f"unknown version {version} for {class_name}")
+        return class_name, version, path
+
+    def _load(self, path: str) -> torch.nn.Module:
+        if path.endswith(".json"):
+            netG = load_weights(path, self.device)
+        else:
+            netG = torch.load(path, map_location=self.device)
+            netG = netG.to(self.device)
+            netG.eval()
+        # warm on load: first forward allocates workspaces and selects kernels
+        with torch.no_grad():
+            netG(torch.zeros(1, self.config.nz, 1, 1, device=self.device))
+        return netG
+
+    def _evict(self, keep) -> None:
+        while self.used > self.memory_bytes and len(self.models) > 1:
+            key, (netG, size, _) = next(iter(self.models.items()))
+            if key == keep:
+                self.models.move_to_end(key)
+                continue
+            del self.models[key]
+            self.used -= size
+            drop_model_version(*key)
+        RESIDENT_MODEL_BYTES.set(self.used)
+        if self.device.type == 'cuda':
+            torch.cuda.empty_cache()
+
+    def get(self, class_name=None, version=None) -> torch.nn.Module:
+        class_name, version, path = self.resolve(class_name, version)
+        checksum = model_checksum(path)
+        key = (class_name, version)
+        with self.lock:
+            entry = self.models.get(key)
+            if entry is not None and entry[2] == checksum:
+                self.models.move_to_end(key)
+                return entry[0]
+            loading = self.loading.setdefault(key, threading.Lock())
+        # one load per model at a time, other classes keep being served meanwhile
+        with loading:
+            with self.lock:
+                entry = self.models.get(key)
+                if entry is not None and entry[2] == checksum:
+                    return entry[0]
+            netG = self._load(path)
+            size = model_bytes(netG)
+            with self.lock:
+                old = self.models.pop(key, None)
+                if old is not None:
+                    self.used -= old[1]
+                self.models[key] = (netG, size, checksum)
+                self.used += size
+                set_model_version(class_name, version, checksum[:12])
+                self._evict(keep=key)
+                self.loading.pop(key, None)
+        return netG
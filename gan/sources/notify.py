@@ -1,52 +1,161 @@
 import os
-import json
-import requests
-import datetime
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from requests import HTTPError
+import time
+import queue
+import atexit
 import base64
+import threading
+import requests
 from email.mime.text import MIMEText
 
+NOTIFIER_ENDPOINT = 'https://api.mynotifier.app'
+SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+TOKEN_FILE = 'token.json'
+# most severe kind wins when several events are batched together
+SEVERITY = {"info": 0, "success": 1, "warning": 2, "error": 3}
+
 class Notifier:
     """
-    Class to send notifications to phone and email
+    Class to send notifications to phone and email.
+    Calls only enqueue: a background thread batches events arriving within batch_window seconds,
+    drops duplicates, and sends them with retries and exponential backoff. Gmail credentials
+    are set up lazily on that thread, so a pending OAuth flow never blocks training.
     """
-    def __init__(self, dev_notifier_keys = [], dev_mail_address = []) -> None:
-        self.users_key = dev_notifier_keys
-        self.mail_address = dev_mail_address
-        self.mailing = True
+    def __init__(self, dev_notifier_keys = [], dev_mail_address = [], endpoint=NOTIFIER_ENDPOINT,
+                 batch_window=5.0, max_retries=4, backoff=1.0, auth_timeout=120) -> None:
+        self.users_key = [key for key in (dev_notifier_keys or []) if key]
+        self.mail_address = [address for address in (dev_mail_address or []) if address]
+        self.endpoint = endpoint
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.auth_timeout = auth_timeout
+        self.mailing = len(self.mail_address) > 0
+        self.service = None
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def notify(self, message: str, description: str, kind: str = "info") -> None:
+        self.notify_phone(message, description, kind)
+        self.send_email(message, description, kind)
+
+    def notify_phone(self, message: str, description: str, kind: str = "info") -> None:
+        if self.users_key and not self.closed:
+            self.queue.put(("phone", kind, message, description))
+
+    def send_email(self, subject: str, description: str, kind: str = "info") -> None:
+        if self.mailing and not self.closed:
+            self.queue.put(("mail", kind, subject, description))
+
+    def close(self, timeout: float = 30.0) -> None:
+        """
+        Flush what is queued, waiting at most timeout seconds.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _worker(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            closing = False
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if closing:
+                return
+
+    def _flush(self, batch: list) -> None:
+        unique = list(dict.fromkeys(batch))
+        for channel in ("phone", "mail"):
+            events = [e for e in unique if e[0] == channel]
+            if not events:
+                continue
+            kind = max((e[1] for e in events), key=lambda k: SEVERITY.get(k, 0))
+            if len(events) == 1:
+                message, description = events[0][2], events[0][3]
+            else:
+                message = f"{len(events)} training events"
+                description = "\n".join(f"{e[2]}: {e[3]}" for e in events)
+            try:
+                if channel == "phone":
+                    self._send_phone(message, description, kind)
+                else:
+                    self._send_mail(message, description)
+            except Exception as e:
+                print(f"Notification '{message}' not delivered: {e}")
+
+    def _retry(self, send) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return send()
+            except Exception:
+                if attempt == self.max_retries or (self.closed and attempt > 0):
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def _send_phone(self, message: str, description: str, kind: str) -> None:
+        for key in self.users_key:
+            def post():
+                response = requests.post(self.endpoint, {
+                    "apiKey": key,
+                    "message": message,
+                    "description": description,
+                    "type": kind, # info, error, warning or success
+                }, timeout=10)
+                response.raise_for_status()
+            self._retry(post)
+
+    def _gmail(self):
+        if self.service is not None or not self.mailing:
+            return self.service
         try:
-            self.scopes = ["https://www.googleapis.com/auth/gmail.send"]
-            self.flow = InstalledAppFlow.from_client_secrets_file('credentials.json', self.scopes)
-            self.creds = self.flow.run_local_server(port=0)
-            self.service = build('gmail', 'v1', credentials=self.creds)
+            from google.oauth2.credentials import Credentials
+            from google.auth.transport.requests import Request
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            from googleapiclient.discovery import build
+            creds = None
+            if os.path.exists(TOKEN_FILE):
+                creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+            if creds is not None and not creds.valid and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            if creds is None or not creds.valid:
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+                creds = flow.run_local_server(port=0, timeout_seconds=self.auth_timeout)
+                with open(TOKEN_FILE, 'w') as f:
+                    f.write(creds.to_json())
+            self.service = build('gmail', 'v1', credentials=creds)
         except Exception as e:
+            print(f"Email notifications disabled: {e}")
             self.mailing = False
+        return self.service
 
-    def send_email(self, subject: str, description: str) -> None:
-        if self.mail_address[0] is None:
-            return
-        if not self.mailing:
+    def _send_mail(self, subject: str, description: str) -> None:
+        service = self._gmail()
+        if service is None:
             return
         for target in self.mail_address:
             message = MIMEText(description)
             message['to'] = target
             message['subject'] = subject
             create_message = {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
-            try:
-                # Send the email using the Gmail API
-                response = self.service.users().messages().send(userId='me', body=create_message).execute()
-            except Exception as e:
-                raise e
-
-    def notify_phone(self, message: str, description: str) -> None:
-        if self.users_key[0] is None:
-            return
-        for key in self.users_key:
-            requests.post('https://api.mynotifier.app', {
-                "apiKey": key,
-                "message": message,
-                "description": description,
-                "type": "info", # info, error, warning or success
-            })
\ No newline at end of file
+            # Send the email using the Gmail API
+            self._retry(lambda: service.users().messages().send(userId='me', body=create_message).execute())
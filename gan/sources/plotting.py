@@ -5,14 +5,14 @@ from matplotlib import pyplot as plt
 def plot_loss(G_losses, D_losses):
     plt.figure(figsize=(10,5))
     plt.title("Generator and Discriminator Loss During Training")
-    plt.plot(G_losses,label="G")
-    plt.plot(D_losses,label="D")
+    plt.plot(np.asarray(G_losses),label="G")
+    plt.plot(np.asarray(D_losses),label="D")
     plt.xlabel("iterations")
     plt.ylabel("Loss")
     plt.legend()
     plt.savefig("loss.png")
 
-def plot_real_fake(real_batch, img_list, device):
+def plot_real_fake(real_batch, snapshots, device):
     plt.figure(figsize=(15,15))
     plt.subplot(1,2,1)
     plt.axis("off")
@@ -22,5 +22,5 @@ def plot_real_fake(real_batch, img_list, device):
     plt.subplot(1,2,2)
     plt.axis("off")
     plt.title("Fake spectrogram")
-    plt.imshow(np.transpose(img_list[-1],(1,2,0)))
+    plt.imshow(np.transpose(snapshots.latest(),(1,2,0)))
     plt.savefig("real_fake.png")
\ No newline at end of file
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+import torch
+
+_NULL_REGION = nullcontext()
+
+class _Region:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.timer.synchronize()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.synchronize()
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class PhaseTimer:
+    """
+    Accumulate wall-clock time per named training phase and report per-epoch breakdowns.
+    When disabled every region is a shared no-op context so the loop pays almost nothing.
+    """
+    def __init__(self, enabled=False, device=None) -> None:
+        self.enabled = enabled
+        self.cuda = device is not None and device.type == 'cuda'
+        self.totals = defaultdict(float)
+
+    def synchronize(self) -> None:
+        # kernels run asynchronously, wait for them so time lands in the right phase
+        if self.cuda:
+            torch.cuda.synchronize()
+
+    def add(self, name: str, seconds: float) -> None:
+        self.totals[name] += seconds
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_REGION
+        return _Region(self, name)
+
+    def iterate(self, name: str, iterable):
+        """
+        Yield from iterable, timing each fetch (DataLoader decode/collate) under name.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def epoch_summary(self) -> dict:
+        """
+        Return {phase_<name>_s, phase_<name>_share} for the epoch and reset the counters.
+        """
+        if not self.enabled:
+            return {}
+        total = sum(self.totals.values())
+        metrics = {}
+        for name, seconds in self.totals.items():
+            metrics[f"phase_{name}_s"] = seconds
+            metrics[f"phase_{name}_share"] = seconds / total if total > 0 else 0.0
+        self.totals.clear()
+        return metrics
+
+def make_profiler(config, device, out_dir="runs/profiler"):
+    """
+    Build a torch.profiler capture window: skip profiler_skip_steps then record profiler_record_steps.
+    Writes a Chrome trace and an operator table to out_dir. Returns None when disabled.
+    """
+    record = config.profiler_record_steps or 0
+    if record <= 0:
+        return None
+    skip = config.profiler_skip_steps or 0
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    sort_by = "self_cpu_time_total"
+    if device.type == 'cuda':
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+        sort_by = "self_cuda_time_total"
+
+    def write_trace(prof):
+        os.makedirs(out_dir, exist_ok=True)
+        prof.export_chrome_trace(f"{out_dir}/trace_step_{prof.step_num}.json")
+        with open(f"{out_dir}/operators_step_{prof.step_num}.txt", 'w') as f:
+            f.write(prof.key_averages().table(sort_by=sort_by, row_limit=50))
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=max(skip - 1, 0), warmup=min(skip, 1), active=record, repeat=1),
+        on_trace_ready=write_trace,
+        record_shapes=True,
+        with_stack=False,
+    )
@@ -0,0 +1,199 @@
+import math
+
+import torch
+import torch.nn as nn
+import torch.utils.data
+import torch.nn.functional as F
+
+from sources.generator import Generator
+from sources.discriminator import Discriminator
+
+# resolution of the first generator block; each later block doubles it (4 -> 256 over 7 blocks)
+BASE_RESOLUTION = 4
+# the discriminator's last conv needs at least 8x8 inputs
+MIN_RESOLUTION = 8
+
+def resolution_level(resolution: int) -> int:
+    return int(math.log2(resolution // BASE_RESOLUTION))
+
+class ProgressiveGenerator(Generator):
+    """
+    Generator that can stop at a lower resolution: hidden block k outputs 4 * 2**(k-1) pixels,
+    a 1x1 to_rgb head turns it into an image. While a new block fades in, its output is blended
+    with the upsampled image of the previous resolution. At full resolution with alpha=1 the
+    computation is exactly Generator.forward.
+    """
+    def __init__(self, config):
+        super(ProgressiveGenerator, self).__init__(config)
+        # to_rgb[j] reads hidden block j+1 (ngf * 2**(5-j) channels), resolutions 4..128
+        self.to_rgb = nn.ModuleList([
+            nn.Conv2d(config.ngf * 2 ** (5 - j), config.nc, kernel_size=1, bias=False) for j in range(6)
+        ])
+        self.to_rgb.apply(self._init_weights)
+        self.max_level = resolution_level(config.image_size[0])
+        self.level = self.max_level
+        self.alpha = 1.0
+
+    def set_stage(self, resolution: int, alpha: float = 1.0) -> None:
+        self.level = resolution_level(resolution)
+        self.alpha = alpha
+
+    def _rgb(self, level: int, hidden: torch.Tensor) -> torch.Tensor:
+        if level == self.max_level:
+            return self.tanh(self.conv7(hidden))
+        return self.tanh(self.to_rgb[level](hidden))
+
+    def forward(self, z: torch.Tensor) -> torch.Tensor:
+        hidden = [z]
+        # blocks 1..level+1 at intermediate levels, all six hidden blocks at full resolution
+        for k in range(1, min(self.level + 1, 6) + 1):
+            conv, relu = getattr(self, f"conv{k}"), getattr(self, f"relu{k}")
+            hidden.append(relu(conv(hidden[-1])))
+        if self.level == self.max_level:
+            image = self._rgb(self.level, hidden[6])
+            previous = hidden[6]
+        else:
+            image = self._rgb(self.level, hidden[self.level + 1])
+            previous = hidden[self.level]
+        if self.alpha < 1.0 and self.level > 0:
+            upsampled = F.interpolate(self._rgb(self.level - 1, previous), scale_factor=2, mode='nearest')
+            image = self.alpha * image + (1 - self.alpha) * upsampled
+        return image
+
+class ProgressiveDiscriminator(Discriminator):
+    """
+    Discriminator that accepts lower resolutions: a 1x1 from_rgb head enters the conv stack at the
+    block whose input has that size. While fading in, the new block's output is blended with the
+    from_rgb path of the 2x downsampled image.
+    """
+    def __init__(self, config):
+        super(ProgressiveDiscriminator, self).__init__(config)
+        # entry block e (2..6) takes ndf * 2**(e-2) channels at 256 / 2**(e-1) pixels
+        self.from_rgb = nn.ModuleDict({
+            str(e): nn.Conv2d(config.nc, config.ndf * 2 ** (e - 2), kernel_size=1, bias=False) for e in range(2, 7)
+        })
+        self.from_rgb.apply(self._init_weights)
+        self.from_relu = nn.LeakyReLU(0.2)
+        self.max_level = resolution_level(config.image_size[0])
+        self.level = self.max_level
+        self.alpha = 1.0
+
+    def set_stage(self, resolution: int, alpha: float = 1.0) -> None:
+        self.level = resolution_level(resolution)
+        self.alpha = alpha
+
+    def _entry(self, e: int, image: torch.Tensor) -> torch.Tensor:
+        if e == 1:
+            return image
+        return self.from_relu(self.from_rgb[str(e)](image))
+
+    def _block(self, k: int, x: torch.Tensor) -> torch.Tensor:
+        return getattr(self, f"relu{k}")(getattr(self, f"conv{k}")(x))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        e = self.max_level + 1 - self.level
+        h = self._entry(e, x)
+        if self.alpha < 1.0 and e < 6:
+            h = self._block(e, h)
+            skip = self._entry(e + 1, F.avg_pool2d(x, 2))
+            h = self.alpha * h + (1 - self.alpha) * skip
+            e += 1
+        for k in range(e, 6):
+            h = self._block(k, h)
+        h = self.conv6(h)
+        return self.flatten(h)
+
+class ResizedDataset(torch.utils.data.Dataset):
+    """
+    Downsampled view of a full-resolution dataset (ImageFolder or the sweep's shared tensors),
+    so progressive stages never decode dataroot again.
+    """
+    def __init__(self, dataset, resolution: int) -> None:
+        self.dataset = dataset
+        self.resolution = resolution
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[idx]
+        # area averaging is a box filter for the power-of-two factors between stages
+        image = F.interpolate(image.unsqueeze(0), size=(self.resolution, self.resolution), mode='area')
+        return image.squeeze(0), label
+
+def stage_dataloader(dataloader, resolution: int):
+    return torch.utils.data.DataLoader(ResizedDataset(dataloader.dataset, resolution),
+                                       batch_size=dataloader.batch_size, shuffle=True,
+                                       num_workers=dataloader.num_workers)
+
+def blend_real(images: torch.Tensor, alpha: float) -> torch.Tensor:
+    """
+    Real-batch counterpart of the fade-in: mix with the upsampled half-resolution version.
+    """
+    if alpha >= 1.0:
+        return images
+    low = F.interpolate(F.avg_pool2d(images, 2), scale_factor=2, mode='nearest')
+    return alpha * images + (1 - alpha) * low
+
+def export_plain(net: nn.Module, plain_class, config) -> nn.Module:
+    """
+    Copy the shared weights into a plain Generator/Discriminator so saved models stay loadable without this module.
+    """
+    inner = net.module if isinstance(net, nn.DataParallel) else net
+    if not isinstance(inner, (ProgressiveGenerator, ProgressiveDiscriminator)):
+        return net
+    plain = plain_class(config).to(next(inner.parameters()).device)
+    plain.load_state_dict(inner.state_dict(), strict=False)
+    return plain
+
+def apply_stage(net: nn.Module, resolution: int, alpha: float) -> None:
+    inner = net.module if isinstance(net, nn.DataParallel) else net
+    inner.set_stage(resolution, alpha)
+
+class ProgressiveSchedule:
+    """
+    progressive_schedule = [[resolution, epochs], ...] of resolutions doubling up to image_size / 2;
+    the remaining epochs run at image_size. The first progressive_fade_epochs of every stage after
+    the first fade the new block in. An empty schedule is plain fixed-resolution training.
+    """
+    def __init__(self, config) -> None:
+        full = config.image_size[0]
+        self.stages = [(int(res), int(epochs)) for res, epochs in (config.progressive_schedule or [])]
+        # every fade blends with the to_rgb/from_rgb heads of the stage right before it,
+        # so stages must double one after the other up to image_size
+        previous = None
+        for res, _ in self.stages:
+            if previous is None:
+                if res < MIN_RESOLUTION or res >= full or res & (res - 1):
+                    raise ValueError(f"first progressive resolution must be a power of two in [{MIN_RESOLUTION}, {full}), got {res}")
+            elif res != 2 * previous:
+                raise ValueError(f"progressive resolutions must double from one stage to the next, got {res} after {previous}")
+            previous = res
+        if self.stages and previous * 2 != full:
+            raise ValueError(f"last progressive resolution must be {full // 2} (half of image_size), got {previous}")
+        low_epochs = sum(epochs for _, epochs in self.stages)
+        if self.stages and low_epochs >= config.num_epochs:
+            raise ValueError(f"progressive stages take {low_epochs} epochs, num_epochs ({config.num_epochs}) leaves none at full resolution")
+        if self.stages:
+            self.stages.append((full, config.num_epochs - sum(epochs for _, epochs in self.stages)))
+        self.fade_epochs = config.progressive_fade_epochs or 0
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.stages) > 0
+
+    def stage(self, epoch: int) -> tuple:
+        """
+        (stage index, resolution, epoch within the stage)
+        """
+        start = 0
+        for idx, (res, epochs) in enumerate(self.stages):
+            if epoch < start + epochs or idx == len(self.stages) - 1:
+                return idx, res, epoch - start
+            start += epochs
+
+    def alpha(self, epoch: int, i: int, n_batches: int) -> float:
+        idx, _, local_epoch = self.stage(epoch)
+        if idx == 0 or self.fade_epochs <= 0:
+            return 1.0
+        return min(1.0, (local_epoch + i / max(n_batches, 1)) / self.fade_epochs)
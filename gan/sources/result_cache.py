@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+def cache_key(model_checksum: str, latent, params: dict) -> str:
+    """
+    Content address of a rendered sound: same model, latent and vocoder settings give the same WAV
+    """
+    digest = hashlib.sha256()
+    digest.update(model_checksum.encode())
+    digest.update(latent.detach().cpu().float().contiguous().numpy().tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    LRU of rendered WAV bytes held in memory, backed by a size-bounded directory on disk.
+    Disk entries are evicted oldest-mtime first; a disk hit refreshes mtime and is promoted to memory.
+    """
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int) -> None:
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.disk = OrderedDict()
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith(".wav"):
+                stat = os.stat(os.path.join(directory, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+        self.disk_used = sum(self.disk.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_used -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_used += len(data)
+        while self.memory_used > self.memory_bytes:
+            _, old = self.memory.popitem(last=False)
+            self.memory_used -= len(old)
+
+    def get(self, key: str):
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                return data
+            if key not in self.disk:
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                self.disk_used -= self.disk.pop(key)
+                return None
+            self.disk.move_to_end(key)
+            self._remember(key, data)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self.lock:
+            self._remember(key, data)
+            if key in self.disk or len(data) > self.disk_bytes:
+                return
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            self.disk[key] = len(data)
+            self.disk_used += len(data)
+            while self.disk_used > self.disk_bytes:
+                old, size = self.disk.popitem(last=False)
+                self.disk_used -= size
+                try:
+                    os.remove(self._path(old))
+                except FileNotFoundError:
+                    pass
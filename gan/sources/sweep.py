@@ -0,0 +1,183 @@
+#!/usr/bin python3
+
+import os
+import json
+import math
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+import torch.multiprocessing
+import torch.optim as optim
+import torch.utils.data
+import torchvision.datasets as datasets
+import torchvision.transforms as transforms
+import mlflow
+
+from sources.config_loader import Config
+from sources.evaluation import real_statistics
+from sources.training import (setup_tracking, seed_everything, setup_generator, setup_discriminator,
+                              training_loop, TrainingDiverged)
+
+# set in each worker by _init_worker: decoded dataset shared with the parent, threads per trial
+_shared = {}
+
+class SharedImageDataset(torch.utils.data.Dataset):
+    """
+    Decoded uint8 images living in shared memory, normalized on access exactly like
+    ToTensor() + Normalize((0.5,)*3, (0.5,)*3) in prepare_data.
+    """
+    def __init__(self, images: torch.Tensor, labels: torch.Tensor) -> None:
+        self.images = images
+        self.labels = labels
+
+    def __len__(self) -> int:
+        return self.images.size(0)
+
+    def __getitem__(self, idx):
+        image = self.images[idx].float().div_(255.0).sub_(0.5).div_(0.5)
+        return image, self.labels[idx]
+
+def decode_dataset(config) -> tuple:
+    """
+    Decode dataroot once into a uint8 (N, C, H, W) tensor moved to shared memory.
+    """
+    dataset = datasets.ImageFolder(root=config.dataroot,
+                                   transform=transforms.Compose([
+                                           transforms.Resize(config.image_size),
+                                           transforms.CenterCrop(config.image_size),
+                                           transforms.PILToTensor(),
+                                   ]))
+    loader = torch.utils.data.DataLoader(dataset, batch_size=config.batch_size, shuffle=False, num_workers=config.workers)
+    images = torch.empty(len(dataset), config.nc, *config.image_size, dtype=torch.uint8)
+    labels = torch.empty(len(dataset), dtype=torch.long)
+    idx = 0
+    for batch, targets in loader:
+        images[idx:idx + batch.size(0)] = batch
+        labels[idx:idx + batch.size(0)] = targets
+        idx += batch.size(0)
+    return images.share_memory_(), labels.share_memory_()
+
+def sample_value(spec, rng: random.Random):
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if "uniform" in spec:
+        return rng.uniform(*spec["uniform"])
+    if "log_uniform" in spec:
+        low, high = spec["log_uniform"]
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if "int" in spec:
+        return rng.randint(*spec["int"])
+    raise ValueError(f"Unknown search space entry {spec}")
+
+def expand_trials(sweep: dict) -> list:
+    """
+    Turn a sweep spec into a list of config overrides: full cartesian product of "grid",
+    plus "n_trials" random draws from "random" (each combined with the fixed "params").
+    """
+    fixed = sweep.get("params", {})
+    trials = []
+    grid = sweep.get("grid", {})
+    if grid:
+        keys = list(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            trials.append(dict(fixed, **dict(zip(keys, values))))
+    space = sweep.get("random", {})
+    rng = random.Random(sweep.get("seed", 0))
+    for _ in range(sweep.get("n_trials", 0) if space else 0):
+        trials.append(dict(fixed, **{k: sample_value(v, rng) for k, v in space.items()}))
+    return trials or [dict(fixed)]
+
+def _init_worker(images, labels, threads) -> None:
+    _shared["dataset"] = SharedImageDataset(images, labels)
+    torch.set_num_threads(threads)
+
+def tracking_uri(spec: dict, config, workers: int) -> str:
+    """
+    Trials log from several processes at once, which one SQLite file does not take ("database is locked").
+    Sweeps log to a file store under saveroot/sweep unless the spec names a tracking server.
+    """
+    uri = spec.get("tracking_uri") or f"file:{os.path.abspath(config.saveroot)}/sweep/mlruns"
+    if uri.startswith("sqlite:") and workers > 1:
+        raise ValueError("A sweep with several workers needs a tracking server or a file store, not SQLite")
+    return uri
+
+def run_trial(trial_id: int, overrides: dict, base: dict, parent_run_id: str, uri: str) -> dict:
+    config = Config()
+    config.__dict__.update(base)
+    config.__dict__.update(overrides)
+    config.saveroot = f"{base['saveroot']}/sweep/trial_{trial_id}"
+    os.makedirs(f"{config.saveroot}/checkpoints", exist_ok=True)
+    if torch.cuda.is_available():
+        device = torch.device(f"cuda:{trial_id % torch.cuda.device_count()}")
+    else:
+        device = torch.device("cpu")
+    setup_tracking(uri)
+    seed_everything()
+    dataloader = torch.utils.data.DataLoader(_shared["dataset"], batch_size=config.batch_size, shuffle=True)
+    netG = setup_generator(config, device)
+    netD = setup_discriminator(config, device)
+    optimizerD = optim.Adam(netD.parameters(), lr=config.lr_D, betas=(config.beta1, 0.999))
+    optimizerG = optim.Adam(netG.parameters(), lr=config.lr_G, betas=(config.beta1, 0.999))
+    result = {"trial": trial_id, "params": overrides}
+    with mlflow.start_run(run_name=f"trial_{trial_id}", tags={"mlflow.parentRunId": parent_run_id}) as run:
+        mlflow.log_params(overrides)
+        try:
+            _, G_losses, D_losses = training_loop(netD, netG, optimizerD, optimizerG, dataloader, device, config)
+        except TrainingDiverged as e:
+            # pruned: stop spending cores on a run that already hit the failure condition
+            mlflow.set_tag("pruned", str(e))
+            result.update(status="pruned", reason=str(e))
+            return result
+        metrics = mlflow.get_run(run.info.run_id).data.metrics
+        result.update(status="done", Loss_G=float(G_losses[-1]), Loss_D=float(D_losses[-1]),
+                      best_FMD=metrics.get("best_FMD"), elapsed_s=metrics.get("elapsed_s"))
+    return result
+
+def sweep(config, sweep_path: str) -> list:
+    """
+    Run every trial of the sweep spec concurrently, sharing one decoded copy of the dataset.
+    """
+    with open(sweep_path, 'r') as f:
+        spec = json.load(f)
+    trials = expand_trials(spec)
+    base = dict(config.__dict__)
+    base.update(spec.get("params", {}))
+    cores = os.cpu_count() or 1
+    workers = spec.get("workers") or cores
+    if torch.cuda.is_available():
+        workers = min(workers, torch.cuda.device_count() * spec.get("trials_per_gpu", 1))
+    workers = max(1, min(workers, len(trials)))
+    threads = max(1, cores // workers)
+    print(f"Sweep: {len(trials)} trials on {workers} workers ({threads} threads each)")
+
+    uri = tracking_uri(spec, config, workers)
+    images, labels = decode_dataset(config)
+    if config.eval_every_epochs:
+        # FMD reference statistics once for the sweep, trials find them in the shared cache
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        real_statistics(config, torch.utils.data.DataLoader(SharedImageDataset(images, labels), batch_size=config.batch_size), device)
+        base["eval_stats_dir"] = config.eval_stats_dir or config.saveroot
+    setup_tracking(uri)
+    results = []
+    with mlflow.start_run(run_name=os.path.basename(sweep_path)) as parent:
+        mlflow.log_param("n_trials", len(trials))
+        context = torch.multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(images, labels, threads)) as pool:
+            futures = [pool.submit(run_trial, i, overrides, base, parent.info.run_id, uri)
+                       for i, overrides in enumerate(trials)]
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"trial": futures.index(future), "status": "failed", "reason": repr(e)}
+                print(f"Trial {result['trial']}: {result['status']} {result}")
+                results.append(result)
+        results.sort(key=lambda r: r["trial"])
+        os.makedirs(f"{config.saveroot}/sweep", exist_ok=True)
+        with open(f"{config.saveroot}/sweep/results.json", 'w') as f:
+            json.dump(results, f, indent=4)
+        mlflow.log_artifact(f"{config.saveroot}/sweep/results.json")
+    return results
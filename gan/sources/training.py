@@ -1,6 +1,8 @@
 #!/usr/bin python3
 
 import os
+import math
+import time
 import random
 
 import torch
@@ -17,14 +19,27 @@ from sources.generator import Generator
 from sources.discriminator import Discriminator
 from sources.plotting import plot_loss, plot_real_fake
 from sources.notify import Notifier
-
-mlflow.set_tracking_uri(uri="sqlite:///mlflow.db")
-mlflow.set_experiment("GAN Training")
+from sources.profiling import PhaseTimer, make_profiler
+from sources.evaluation import QualityEvaluator
+from sources.history import LossHistory, SnapshotStore
+from sources.weights import save_weights
+from sources.progressive import (ProgressiveGenerator, ProgressiveDiscriminator, ProgressiveSchedule,
+                                 apply_stage, blend_real, export_plain, stage_dataloader)
 
 seed = 657587
-random.seed(seed)
-torch.manual_seed(seed)
-torch.use_deterministic_algorithms(True)
+
+class TrainingDiverged(Exception):
+    pass
+
+# called from training() rather than at import so importing this module has no side effects
+def setup_tracking(uri: str = "sqlite:///mlflow.db") -> None:
+    mlflow.set_tracking_uri(uri=uri)
+    mlflow.set_experiment("GAN Training")
+
+def seed_everything(seed: int = seed) -> None:
+    random.seed(seed)
+    torch.manual_seed(seed)
+    torch.use_deterministic_algorithms(True)
 
 def weight_clipping(model: nn.Module, clip_value: float) -> None:
     for param in model.parameters():
@@ -81,7 +96,7 @@ def prepare_data(config):
 
 def setup_generator(config, device):
     # generator init
-    netG = Generator(config).to(device)
+    netG = (ProgressiveGenerator if config.progressive_schedule else Generator)(config).to(device)
     if (device.type == 'cuda') and (config.ngpu > 1):
         netG = nn.DataParallel(netG, list(range(config.ngpu)))
     print(netG)
@@ -89,95 +104,163 @@ def setup_generator(config, device):
 
 def setup_discriminator(config, device):
     # discriminator init
-    netD = Discriminator(config).to(device)
+    netD = (ProgressiveDiscriminator if config.progressive_schedule else Discriminator)(config).to(device)
     if (device.type == 'cuda') and (config.ngpu > 1):
         netD = nn.DataParallel(netD, list(range(config.ngpu)))
     print(netD)
     return netD
 
-def training_loop(netD, netG, optimizerD, optimizerG, dataloader, device, config):
-    img_list = []
-    G_losses = []
-    D_losses = []
+def training_loop(netD, netG, optimizerD, optimizerG, dataloader, device, config, notifier=None):
+    active_run = mlflow.active_run()
+    snapshots = SnapshotStore(f"{config.saveroot}/snapshots", config.snapshot_keep,
+                              active_run.info.run_id if active_run and config.snapshot_to_mlflow else None)
+    G_losses = LossHistory()
+    D_losses = LossHistory()
     iters = 0
     fixed_noise = torch.randn(64, config.nz, 1, 1, device=device)
     current_noise_std = config.initial_noise_std
     real_label = 1
-    print("start training...")
-    for epoch in range(config.num_epochs):
-        for i, data in enumerate(dataloader, 0):
-            ############################
-            # Update D network: maximize log(D(x)) + log(1 - D(G(z)))
-            ###########################
-
-            ## Discriminator real batch training, for first gradient update ##
-
-            netD.zero_grad()
-            # Train with real batch
-            real_cpu = data[0].to(device)
-            b_size = real_cpu.size(0)
-            label = torch.full((b_size,), real_label, dtype=torch.float, device=device)
-            noisy_real = add_instance_noise(real_cpu, current_noise_std)
-            real_output = netD(noisy_real).view(-1)
-            # Train with fake batch
-            noise = torch.randn(b_size, config.nz, 1, 1, device=device)  # Generate batch of latents
-            fakes = netG(noise)
-            noisy_fakes = add_instance_noise(fakes.detach(), current_noise_std)
-            fake_output = netD(noisy_fakes).view(-1)
-            # Compute gradient penalty
-            gp = gradient_penalty(netD, noisy_real, noisy_fakes, device)  # Add gradient penalty
-            # Compute Wasserstein loss
-            lossD = -real_output.mean() + fake_output.mean() + 10 * gp  # WGAN loss with gp
-            # Backward pass and step
-            lossD.backward()
-            optimizerD.step()
-
-            if lossD.item() == 0.0:
-                print("Discriminator loss is 0.0, failure!")
-                exit(1)
-
-            ############################
-            # Update G network: maximize log(D(G(z)))
-            ###########################
-            netG.zero_grad()
-            label.fill_(real_label)
-            # Add noise to fake images for generator update
-            noisy_fakes = add_instance_noise(fakes, current_noise_std)
-            output = netD(noisy_fakes).view(-1)
-            #calculate generator loss
-            lossG = wasserstein_loss(output, label)
-            # calculate generator gradients in backward
-            lossG.backward()
-            D_G_z2 = output.mean().item()
-            # gradient step
-            optimizerG.step()
-
-            current_noise_std *= config.noise_decay_rate
-            # Output training stats
-            if i % 50 == 0:
-                print('[%d/%d][%d/%d]\tLoss_D: %.4f\tLoss_G: %.4f' % (epoch, config.num_epochs, i, len(dataloader), lossD.item(), lossG.item()))
-            # Save Losses for plotting later
-            G_losses.append(lossG.item())
-            D_losses.append(lossD.item())
-
-            mlflow.log_metric("Loss_G", lossG.item(), epoch)
-            mlflow.log_metric("Loss_D", lossD.item(), epoch)
-            if (iters % 500 == 0) or ((epoch == config.num_epochs-1) and (i == len(dataloader)-1)):
-                with torch.no_grad():
-                    fakes = netG(fixed_noise).detach().cpu()
-                img_list.append(vutils.make_grid(fakes, padding=2, normalize=True))
-            iters += 1
-        torch.save(netD.state_dict(), f"{config.saveroot}/checkpoints/checkpoint_D_{epoch}.pt")
-        torch.save(netG.state_dict(), f"{config.saveroot}/checkpoints/checkpoint_G_{epoch}.pt")
-        if epoch > 0:
-            os.remove(f"{config.saveroot}/checkpoints/checkpoint_D_{epoch-1}.pt")
-            os.remove(f"{config.saveroot}/checkpoints/checkpoint_G_{epoch-1}.pt")
-    torch.save(netD, f"{config.saveroot}/model_D.pt")
-    torch.save(netG, f"{config.saveroot}/model_G.pt")
-    return img_list, G_losses, D_losses
+    timer = PhaseTimer(config.profile_phases, device)
+    profiler = make_profiler(config, device)
+    evaluator = QualityEvaluator(config, device)
+    schedule = ProgressiveSchedule(config)
+    full_dataloader = dataloader
+    resolution = config.image_size[0]
+    current_stage = None
+    alpha = 1.0
+    start_time = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+    try:
+        print("start training...")
+        for epoch in range(config.num_epochs):
+            if schedule.enabled:
+                stage_idx, resolution, _ = schedule.stage(epoch)
+                if stage_idx != current_stage:
+                    current_stage = stage_idx
+                    dataloader = full_dataloader if resolution == config.image_size[0] else stage_dataloader(full_dataloader, resolution)
+                    print(f"Progressive stage {stage_idx}: {resolution}x{resolution}")
+                    mlflow.log_metric("resolution", resolution, epoch)
+            for i, data in enumerate(timer.iterate("data", dataloader), 0):
+                if schedule.enabled:
+                    alpha = schedule.alpha(epoch, i, len(dataloader))
+                    apply_stage(netG, resolution, alpha)
+                    apply_stage(netD, resolution, alpha)
+                ############################
+                # Update D network: maximize log(D(x)) + log(1 - D(G(z)))
+                ###########################
+
+                ## Discriminator real batch training, for first gradient update ##
+
+                with timer.phase("d_forward"):
+                    netD.zero_grad()
+                    # Train with real batch
+                    real_cpu = data[0].to(device)
+                    if schedule.enabled:
+                        real_cpu = blend_real(real_cpu, alpha)
+                    b_size = real_cpu.size(0)
+                    label = torch.full((b_size,), real_label, dtype=torch.float, device=device)
+                    noisy_real = add_instance_noise(real_cpu, current_noise_std)
+                    real_output = netD(noisy_real).view(-1)
+                    # Train with fake batch
+                    noise = torch.randn(b_size, config.nz, 1, 1, device=device)  # Generate batch of latents
+                    fakes = netG(noise)
+                    noisy_fakes = add_instance_noise(fakes.detach(), current_noise_std)
+                    fake_output = netD(noisy_fakes).view(-1)
+                with timer.phase("gradient_penalty"):
+                    # Compute gradient penalty
+                    gp = gradient_penalty(netD, noisy_real, noisy_fakes, device)  # Add gradient penalty
+                    # Penalty backward (the double-backward) on its own so the phase covers its full cost;
+                    # its graph is disjoint from the Wasserstein terms and gradients accumulate
+                    (10 * gp).backward()
+                with timer.phase("d_step"):
+                    # Compute Wasserstein loss
+                    wasserstein = -real_output.mean() + fake_output.mean()
+                    wasserstein.backward()
+                    optimizerD.step()
+                    lossD = wasserstein.detach() + 10 * gp.detach()  # WGAN loss with gp
+
+                if lossD.item() == 0.0 or not math.isfinite(lossD.item()):
+                    print(f"Discriminator loss is {lossD.item()}, failure!")
+                    raise TrainingDiverged(f"Discriminator loss is {lossD.item()} at epoch {epoch}, iteration {i}")
+
+                ############################
+                # Update G network: maximize log(D(G(z)))
+                ###########################
+                with timer.phase("g_step"):
+                    netG.zero_grad()
+                    label.fill_(real_label)
+                    # Add noise to fake images for generator update
+                    noisy_fakes = add_instance_noise(fakes, current_noise_std)
+                    output = netD(noisy_fakes).view(-1)
+                    #calculate generator loss
+                    lossG = wasserstein_loss(output, label)
+                    # calculate generator gradients in backward
+                    lossG.backward()
+                    D_G_z2 = output.mean().item()
+                    # gradient step
+                    optimizerG.step()
+
+                current_noise_std *= config.noise_decay_rate
+                # Output training stats
+                if i % 50 == 0:
+                    print('[%d/%d][%d/%d]\tLoss_D: %.4f\tLoss_G: %.4f' % (epoch, config.num_epochs, i, len(dataloader), lossD.item(), lossG.item()))
+                # Save Losses for plotting later
+                G_losses.append(lossG.item())
+                D_losses.append(lossD.item())
+
+                with timer.phase("mlflow"):
+                    mlflow.log_metric("Loss_G", lossG.item(), epoch)
+                    mlflow.log_metric("Loss_D", lossD.item(), epoch)
+                if (iters % 500 == 0) or ((epoch == config.num_epochs-1) and (i == len(dataloader)-1)):
+                    with timer.phase("snapshot"):
+                        with torch.no_grad():
+                            fakes = netG(fixed_noise).detach().cpu()
+                        snapshots.add(vutils.make_grid(fakes, padding=2, normalize=True), iters)
+                iters += 1
+                if profiler is not None:
+                    profiler.step()
+            with timer.phase("checkpoint"):
+                torch.save(netD.state_dict(), f"{config.saveroot}/checkpoints/checkpoint_D_{epoch}.pt")
+                torch.save(netG.state_dict(), f"{config.saveroot}/checkpoints/checkpoint_G_{epoch}.pt")
+                if epoch > 0:
+                    os.remove(f"{config.saveroot}/checkpoints/checkpoint_D_{epoch-1}.pt")
+                    os.remove(f"{config.saveroot}/checkpoints/checkpoint_G_{epoch-1}.pt")
+            mlflow.log_metric("elapsed_s", time.perf_counter() - start_time, epoch)
+            # FMD is only comparable against the cached full-resolution statistics,
+            # and a generator still fading in its last block is not a best_G candidate
+            if evaluator.due(epoch) and resolution == config.image_size[0] and alpha >= 1.0:
+                with timer.phase("evaluation"):
+                    distance = evaluator.evaluate(netG, full_dataloader)
+                    mlflow.log_metric("FMD", distance, epoch)
+                    if evaluator.step(epoch, distance, netG):
+                        mlflow.set_tag("best_epoch", epoch)
+                        mlflow.log_metric("best_FMD", distance, epoch)
+                print(f"[{epoch}/{config.num_epochs}]\tFMD: {distance:.4f}\tbest: {evaluator.best:.4f} (epoch {evaluator.best_epoch})")
+            phase_metrics = timer.epoch_summary()
+            if phase_metrics:
+                mlflow.log_metrics(phase_metrics, step=epoch)
+            every = config.notify_every_epochs or 0
+            if notifier is not None and every > 0 and (epoch + 1) % every == 0:
+                notifier.notify(f"GAN training epoch {epoch + 1}/{config.num_epochs}",
+                                f"Loss_G: {G_losses[-1]:.4f} Loss_D: {D_losses[-1]:.4f}")
+            if evaluator.should_stop():
+                print(f"No FMD improvement for {config.eval_patience} evaluations, stopping early.")
+                break
+    finally:
+        # also on divergence, so the trace window is written and sweep workers do not keep profiling
+        if profiler is not None:
+            profiler.stop()
+        snapshots.close()
+    torch.save(export_plain(netD, Discriminator, config), f"{config.saveroot}/model_D.pt")
+    torch.save(export_plain(netG, Generator, config), f"{config.saveroot}/model_G.pt")
+    save_weights(netG.state_dict(), config, f"{config.saveroot}/model_G")
+    return snapshots, G_losses, D_losses
 
 def training(device, config):
-    notifier = Notifier(config.dev_notifier_keys, config.dev_mail_address)
+    setup_tracking()
+    seed_everything()
+    notifier = Notifier(config.dev_notifier_keys, config.dev_mail_address, config.notify_endpoint)
     # data
     dataloader = prepare_data(config)
     # model
@@ -188,11 +271,21 @@ def training(device, config):
     optimizerG = optim.Adam(netG.parameters(), lr=config.lr_G, betas=(config.beta1, 0.999))
 
     mlflow.log_params(config.__dict__)
-    with mlflow.start_run(nested=True):
-        img_list, G_losses, D_losses = training_loop(netD, netG, optimizerD, optimizerG, dataloader, device, config)
+    try:
+        with mlflow.start_run(nested=True):
+            snapshots, G_losses, D_losses = training_loop(netD, netG, optimizerD, optimizerG, dataloader, device, config, notifier)
+    except TrainingDiverged as e:
+        notifier.notify("GAN training failed", str(e), "error")
+        notifier.close()
+        exit(1)
+    except Exception as e:
+        notifier.notify("GAN training failed", repr(e), "error")
+        notifier.close()
+        raise
 
     real_batch = next(iter(dataloader))
     plot_loss(G_losses, D_losses)
-    plot_real_fake(real_batch, img_list, device)
+    plot_real_fake(real_batch, snapshots, device)
 
-    notifier.notify_phone("GAN training done", f"Loss_G: {G_losses[-1].item()} Loss_D: {D_losses[-1].item()}")
+    notifier.notify("GAN training done", f"Loss_G: {G_losses[-1]} Loss_D: {D_losses[-1]}", "success")
+    notifier.close()
@@ -0,0 +1,98 @@
+import os
+import json
+import hashlib
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from sources.config_loader import Config
+from sources.generator import Generator
+from sources.discriminator import Discriminator
+
+FORMAT_VERSION = 1
+# tensors start on 64-byte boundaries so every dtype view of the mapping is aligned
+ALIGNMENT = 64
+ARCHITECTURES = {"Generator": Generator, "Discriminator": Discriminator}
+# Config fields the architectures are built from
+ARCHITECTURE_FIELDS = ("nz", "ngf", "ndf", "nc", "image_size", "original_image_size")
+
+def _strip_prefix(state: dict) -> dict:
+    # nn.DataParallel checkpoints prefix every key with "module."
+    return {k[len("module."):] if k.startswith("module.") else k: v for k, v in state.items()}
+
+def _build(architecture: str, config) -> nn.Module:
+    # meta tensors: no memory allocated and no random init, the weights are assigned afterwards
+    with torch.device("meta"):
+        return ARCHITECTURES[architecture](config)
+
+def save_weights(state: dict, config, prefix: str, architecture: str = "Generator") -> str:
+    """
+    Write prefix.weights (raw tensors back to back) and prefix.json (architecture config and tensor table).
+    Keys the architecture does not have, e.g. progressive to_rgb heads, are dropped. Returns the header path.
+    """
+    state = _strip_prefix(state)
+    expected = _build(architecture, config).state_dict().keys()
+    tensors = {}
+    offset = 0
+    digest = hashlib.sha256()
+    with open(f"{prefix}.weights", 'wb') as f:
+        for name in expected:
+            array = state[name].detach().cpu().contiguous().numpy()
+            padding = (-offset) % ALIGNMENT
+            f.write(b"\0" * padding)
+            offset += padding
+            data = array.tobytes()
+            f.write(data)
+            digest.update(data)
+            tensors[name] = {"dtype": str(array.dtype), "shape": list(array.shape), "offset": offset}
+            offset += len(data)
+    header = {
+        "format": FORMAT_VERSION,
+        "architecture": architecture,
+        "config": {field: getattr(config, field) for field in ARCHITECTURE_FIELDS},
+        "weights": os.path.basename(f"{prefix}.weights"),
+        "weights_sha256": digest.hexdigest(),
+        "tensors": tensors,
+    }
+    with open(f"{prefix}.json", 'w') as f:
+        json.dump(header, f, indent=4)
+    return f"{prefix}.json"
+
+def load_weights(header_path: str, device) -> nn.Module:
+    """
+    Build the model from the header's config and point its parameters at a read-only mmap of the weights.
+    On CPU nothing is copied and the pages are shared by every process mapping the file;
+    other devices get one copy from the mapping.
+    """
+    with open(header_path, 'r') as f:
+        header = json.load(f)
+    config = Config()
+    config.__dict__.update(header["config"])
+    weights_path = os.path.join(os.path.dirname(header_path), header["weights"])
+    mapping = np.memmap(weights_path, dtype=np.uint8, mode='r')
+    state = {}
+    with warnings.catch_warnings():
+        # the mapping is read-only on purpose, inference never writes to the weights
+        warnings.simplefilter("ignore", UserWarning)
+        for name, spec in header["tensors"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            array = mapping[spec["offset"]:spec["offset"] + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+            state[name] = torch.from_numpy(array)
+    model = _build(header["architecture"], config)
+    model.load_state_dict(state, assign=True)
+    model.requires_grad_(False)
+    if torch.device(device).type != 'cpu':
+        model = model.to(device)
+    model.eval()
+    return model
+
+def convert_checkpoint(path: str, config, architecture: str = "Generator") -> str:
+    """
+    Convert a pickled model (model_G.pt) or a state dict checkpoint (checkpoint_G_N.pt) next to itself.
+    """
+    loaded = torch.load(path, map_location="cpu")
+    state = loaded.state_dict() if isinstance(loaded, nn.Module) else loaded
+    return save_weights(state, config, os.path.splitext(path)[0], architecture)
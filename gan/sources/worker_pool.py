@@ -0,0 +1,72 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sources.metrics import STAGE_LATENCY, POOL_PENDING
+
+def _init_worker() -> None:
+    from sources.inference import warm_up_vocoder
+    warm_up_vocoder()
+
+def _render_job(img, original_image_size, output_file, params) -> dict:
+    from sources.inference import render_wav
+    render_wav(img, original_image_size, output_file, params)
+    # stage timings were recorded in this process, hand them back to the server
+    return STAGE_LATENCY.take()
+
+def _noop() -> None:
+    return None
+
+class VocoderPool:
+    """
+    Process pool running the CPU-bound vocoder stages outside the GIL.
+    Admission is bounded: at most workers + queue_depth jobs are queued or running,
+    try_acquire() returns False beyond that so the caller can shed load.
+    """
+    def __init__(self, workers: int, queue_depth: int) -> None:
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.pending = 0
+        self.lock = threading.Lock()
+        # spawn: forking a process that already holds torch/CUDA state is unsafe
+        self.executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker)
+
+    def warm_up(self) -> None:
+        """
+        Start every worker process (and its initializer) before traffic arrives.
+        """
+        futures = [self.executor.submit(_noop) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.pending >= self.capacity:
+                return False
+            self.pending += 1
+            POOL_PENDING.set(self.pending)
+            return True
+
+    def release(self, _future=None) -> None:
+        with self.lock:
+            self.pending -= 1
+            POOL_PENDING.set(self.pending)
+
+    def submit_render(self, img, original_image_size, output_file, params):
+        """
+        Submit a render for a slot taken with try_acquire(); the slot is released when the job
+        finishes or is cancelled. Merges the worker's stage timings into this process.
+        """
+        future = self.executor.submit(_render_job, img, original_image_size, output_file, params)
+        future.add_done_callback(self.release)
+        future.add_done_callback(_merge_stages)
+        return future
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+def _merge_stages(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        STAGE_LATENCY.merge(future.result())
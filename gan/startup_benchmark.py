@@ -0,0 +1,66 @@
+#!/usr/bin python3
+
+"""
+Cold start benchmark for the inference microservice.
+Each measurement runs in a fresh interpreter; exits 1 when a budget is exceeded.
+
+    python3 startup_benchmark.py --import-budget 3 --ready-budget 60
+"""
+
+import sys
+import argparse
+import subprocess
+
+IMPORT_APP = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+IMPORT_TRAINING = """
+import os
+import torch
+had_db = os.path.exists("mlflow.db")
+import sources.training
+assert not torch.are_deterministic_algorithms_enabled(), "sources.training changed torch flags at import"
+assert had_db or not os.path.exists("mlflow.db"), "sources.training configured mlflow at import"
+print(0.0)
+"""
+
+READY = """
+import time
+start = time.perf_counter()
+import app
+app.warm_up_model()
+assert app.state["ready"], app.state["error"]
+print(time.perf_counter() - start)
+"""
+
+def run_snippet(code: str) -> float:
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    return float(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--import-budget', type=float, default=3.0, help='Max seconds to import app.')
+    parser.add_argument('--ready-budget', type=float, default=60.0, help='Max seconds from import to warmed-up model.')
+    parser.add_argument('--skip-ready', action='store_true', help='Only check imports (no model needed).')
+    args = parser.parse_args()
+
+    failed = False
+    import_time = run_snippet(IMPORT_APP)
+    print(f"import app: {import_time:.2f}s (budget {args.import_budget:.2f}s)")
+    failed |= import_time > args.import_budget
+    run_snippet(IMPORT_TRAINING)
+    print("import sources.training: no side effects")
+    if not args.skip_ready:
+        ready_time = run_snippet(READY)
+        print(f"time to ready: {ready_time:.2f}s (budget {args.ready_budget:.2f}s)")
+        failed |= ready_time > args.ready_budget
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()